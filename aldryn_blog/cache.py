@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import math
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .conf import settings
+
+
+CACHE_PREFIX = 'aldryn_blog'
+
+
+def _generation_key(namespace):
+    return '%s:generation:%s' % (CACHE_PREFIX, namespace)
+
+
+def get_generation(namespace='blog'):
+    """
+    Returns the current generation of the given namespace.
+
+    A missing counter (cold cache or eviction) is re-seeded from the clock
+    so entries stored under an older generation are never picked up again.
+    """
+    key = _generation_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        generation = int(time.time() * 1000)
+        cache.add(key, generation, settings.ALDRYN_BLOG_GENERATION_TIMEOUT)
+        generation = cache.get(key, generation)
+    return generation
+
+
+def bump_generation(namespace='blog'):
+    """
+    Moves the given namespace to a new generation, which orphans every entry
+    cached under the previous one on all workers at once. A new blog
+    generation is also recorded as the last change of the blog.
+    """
+    if namespace == 'blog':
+        record_blog_change(None)
+    key = _generation_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = int(time.time() * 1000)
+        cache.set(key, generation, settings.ALDRYN_BLOG_GENERATION_TIMEOUT)
+        return generation
+
+
+def make_key(*bits, **kwargs):
+    """
+    Builds a cache key from the given bits, prefixed with the generation of
+    the ``namespace`` keyword argument (defaults to 'blog').
+    """
+    namespace = kwargs.pop('namespace', 'blog')
+    bits = [CACHE_PREFIX, namespace, get_generation(namespace)] + list(bits)
+    return ':'.join(str(bit) for bit in bits)
+
+
+def _last_change_key():
+    return '%s:last-change' % CACHE_PREFIX
+
+
+def get_last_change():
+    """
+    Returns when anything in the blog last changed (every new generation,
+    deleted posts, edited tags and categories). A missing value is re-seeded
+    with the current time.
+    """
+    key = _last_change_key()
+    last_change = cache.get(key)
+    if last_change is None:
+        cache.add(key, timezone.now(), settings.ALDRYN_BLOG_GENERATION_TIMEOUT)
+        last_change = cache.get(key) or timezone.now()
+    return last_change
+
+
+def get_publication_boundary(language=None):
+    """
+    Returns the next moment a post enters or leaves the publication window
+    (in the given language), or None. The result is cached until then.
+    """
+    from .models import Post
+
+    key = make_key('publication-boundary', language)
+    boundary = cache.get(key)
+    if boundary is None:
+        boundary = Post.objects.get_next_publication_boundary(language) or False
+        timeout = settings.ALDRYN_BLOG_GENERATION_TIMEOUT
+        if boundary:
+            timeout = min(timeout, get_seconds_until(boundary))
+        cache.set(key, boundary, timeout)
+    return boundary or None
+
+
+def get_seconds_until(moment):
+    return max(1, int(math.ceil((moment - timezone.now()).total_seconds())))
+
+
+def get_timeout(language=None):
+    """
+    Returns the cache timeout for published content, shortened so entries
+    expire at the next publication boundary.
+    """
+    timeout = settings.ALDRYN_BLOG_CACHE_TIMEOUT
+    boundary = get_publication_boundary(language)
+    if boundary:
+        timeout = min(timeout, get_seconds_until(boundary))
+    return timeout
+
+
+def get_or_set(key, callback, timeout=None):
+    """
+    Returns the cached value for key, calling callback to fill the cache on
+    a miss. By default entries expire at the next publication boundary.
+    """
+    value = cache.get(key)
+    if value is None:
+        value = callback()
+        cache.set(key, value, get_timeout() if timeout is None else timeout)
+    return value
+
+
+def get_post_item_key(post, language, image, edit_mode):
+    """
+    Returns the key of a rendered list item, which changes with the post's
+    updated_at so edits never hit an outdated entry.
+    """
+    return '%s:item:%s:%s:%s:%d:%d' % (
+        CACHE_PREFIX, post.pk, post.updated_at.strftime('%Y%m%d%H%M%S%f'), language, bool(image), bool(edit_mode))
+
+
+def get_post_content_key(post, language):
+    """
+    Returns the key of a rendered content placeholder, which changes with the
+    post's updated_at (bumped by every plugin change in the placeholder).
+    """
+    return '%s:content:%s:%s:%s:%s' % (
+        CACHE_PREFIX, post.pk, post.updated_at.strftime('%Y%m%d%H%M%S%f'), language,
+        timezone.get_current_timezone_name().replace(' ', '_'))
+
+
+def get_plugin_text_key(plugin, language):
+    """
+    Returns the key of the text extracted from a plugin for the search index
+    """
+    return '%s:plugin-text:%s:%s:%s' % (
+        CACHE_PREFIX, plugin.pk, plugin.changed_date.strftime('%Y%m%d%H%M%S%f'), language)
+
+
+def invalidate_blog_cache(sender, **kwargs):
+    """
+    Signal receiver to drop all cached blog aggregates
+    """
+    bump_generation()
+
+
+def invalidate_pages_cache(sender, **kwargs):
+    """
+    Signal receiver to drop the cached data about CMS pages
+    """
+    bump_generation('pages')
+
+
+def record_blog_change(sender, **kwargs):
+    """
+    Signal receiver to remember when the blog last changed
+    """
+    cache.set(_last_change_key(), timezone.now(), settings.ALDRYN_BLOG_GENERATION_TIMEOUT)
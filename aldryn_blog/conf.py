@@ -7,6 +7,14 @@ from appconf import AppConf
 class AldrynBlogAppConf(AppConf):
     PLUGIN_LANGUAGE = settings.LANGUAGES[0][0]
     SEARCH = True
+    CACHE_TIMEOUT = 60 * 5
+    GENERATION_TIMEOUT = 60 * 60 * 24 * 30
+    NOW_GRANULARITY = 0
+    CONTENT_CACHE_TIMEOUT = 60 * 60
+    RELATED_POSTS_LIMIT = 20
+    RELATED_TAGS_LIMIT = 10
+    CURSOR_PAGINATION = False
+    EXACT_COUNT_LIMIT = 1000
 
     class Meta:
         prefix = 'ALDRYN_BLOG'
@@ -1,17 +1,45 @@
 # -*- coding: utf-8 -*-
 import datetime
+import hashlib
 
-from django.contrib.sites.models import Site
+from django.contrib.sites.models import Site, get_current_site
 from django.contrib.syndication.views import Feed
 from django.core.urlresolvers import reverse
-from django.db.models import Q
+from django.http import HttpResponse
 from django.utils.translation import ugettext as _, get_language
+from django.views.decorators.http import condition
 
+from aldryn_blog.cache import get_last_change, get_or_set, make_key
 from aldryn_blog.models import Post
 
 
 class LatestEntriesFeed(Feed):
 
+    def __call__(self, request, *args, **kwargs):
+        """
+        Serves the feed from the cache (per feed type, object, language and
+        the site and scheme of its absolute links) and answers conditional
+        requests with 304 Not Modified.
+        """
+        path = hashlib.md5(request.path.encode('utf-8')).hexdigest()
+        domain = hashlib.md5(get_current_site(request).domain.encode('utf-8')).hexdigest()
+        key = make_key('feed', self.__class__.__name__, path, get_language(), domain, int(request.is_secure()))
+        content, content_type, last_modified = get_or_set(
+            key, lambda: self.render_feed(request, *args, **kwargs))
+        etag = hashlib.md5(content).hexdigest()
+
+        @condition(etag_func=lambda request: etag, last_modified_func=lambda request: last_modified)
+        def feed(request):
+            return HttpResponse(content, content_type=content_type)
+        return feed(request)
+
+    def render_feed(self, request, *args, **kwargs):
+        response = super(LatestEntriesFeed, self).__call__(request, *args, **kwargs)
+        dates = [get_last_change()]
+        for item in self.items(self.get_object(request, *args, **kwargs)):
+            dates.extend([item.publication_start, item.updated_at])
+        return response.content, response['Content-Type'], max(dates)
+
     def link(self):
         return reverse('aldryn_blog:latest-posts')
 
@@ -19,9 +47,7 @@ class LatestEntriesFeed(Feed):
         return _('Blog posts on %(site_name)s') % {'site_name': Site.objects.get_current().name}
 
     def items(self, obj):
-        return Post.published.filter(
-            Q(language=get_language()) | Q(language__isnull=True)
-        ).order_by('-publication_start')[:10]
+        return Post.published.filter_by_language(get_language()).order_by('-publication_start')[:10]
 
     def item_title(self, item):
         return item.title
@@ -48,4 +74,5 @@ class CategoryFeed(LatestEntriesFeed):
         return category
 
     def items(self, obj):
-        return Post.published.filter(category__slug=obj)[:10]
+        return Post.published.filter(
+            category__translations__slug=obj, category__translations__language_code=get_language())[:10]
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import re
+from optparse import make_option
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import CommandError, NoArgsCommand
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from aldryn_blog.models import Category, Post, PostVisibility, TaggedUnicodeItem, UniTag
+from aldryn_blog.utils import get_date_range, get_languages, get_now
+
+
+# plan lines showing that a table is read completely, per database vendor
+FULL_SCAN_PATTERNS = {
+    'sqlite': r'^SCAN (TABLE )?(?P<table>\w+)\b(?! USING)',
+    'postgresql': r'Seq Scan on (?P<table>\w+)',
+}
+CHECKED_TABLES = (Post._meta.db_table, PostVisibility._meta.db_table, TaggedUnicodeItem._meta.db_table)
+
+
+class Command(NoArgsCommand):
+    help = ('Explains the queries of the public blog pages and fails if one of them reads the whole post, post '
+            'visibility or tagged item table. Run it against a database of realistic size, as small tables are '
+            'scanned regardless of the indexes.')
+    option_list = NoArgsCommand.option_list + (
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+                    help='Database to explain the queries on (default: "default").'),
+    )
+
+    def handle_noargs(self, **options):
+        connection = connections[options['database']]
+        if connection.vendor not in FULL_SCAN_PATTERNS and connection.vendor != 'mysql':
+            raise CommandError('Query plans of %s databases are not supported.' % connection.vendor)
+
+        failed = []
+        for name, queryset in self.get_querysets():
+            sql, params = queryset.using(options['database']).query.sql_with_params()
+            plan = self.explain(connection, sql, params)
+            scanned = self.get_scanned_tables(connection, plan)
+            self.stdout.write('%s: %s' % (name, 'FULL SCAN of %s' % ', '.join(scanned) if scanned else 'ok'))
+            if options['verbosity'] > 1 or scanned:
+                self.stdout.write('    %s' % sql)
+                for line in plan:
+                    self.stdout.write('    %s' % line)
+            if scanned:
+                failed.append(name)
+        if failed:
+            raise CommandError('Queries not using an index: %s' % ', '.join(failed))
+
+    def get_querysets(self):
+        language = get_languages()[0]
+        now = get_now()
+        # the archive filters in the default time zone, like the monthly post counts
+        start, end = get_date_range(now.year, now.month, tz=timezone.get_default_timezone())
+        posts = Post.published.filter_by_language(language)
+        category = Category.objects.untranslated().values_list('pk', flat=True).first()
+        tag = UniTag.objects.values_list('slug', flat=True).first()
+        post_id, author_id = Post.objects.values_list('pk', 'author').first() or (None, None)
+        return [
+            ('latest posts', posts[:10]),
+            ('archive month', posts.filter(publication_start__gte=start, publication_start__lt=end)[:10]),
+            ('category posts', posts.filter(category=category)[:10]),
+            ('tagged posts', posts.filter(tags__slug=tag)[:10]),
+            ('author posts', posts.filter(author=author_id)[:10]),
+            ('related posts', Post.published.filter(related_by__post=post_id).order_by('-related_by__score')[:10]),
+            ('latest related posts', Post.published.filter(language=language).order_by('-publication_start')[:10]),
+            ('post tags', TaggedUnicodeItem.objects.filter(
+                content_type=ContentType.objects.get_for_model(Post), object_id=post_id)),
+        ]
+
+    def explain(self, connection, sql, params):
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        cursor = connection.cursor()
+        cursor.execute(prefix + sql, params)
+        if connection.vendor == 'mysql':
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return [row[-1] if connection.vendor == 'sqlite' else row[0] for row in cursor.fetchall()]
+
+    def get_scanned_tables(self, connection, plan):
+        if connection.vendor == 'mysql':
+            return [row['table'] for row in plan if row['type'] == 'ALL' and row['table'] in CHECKED_TABLES]
+        scanned = []
+        for line in plan:
+            match = re.search(FULL_SCAN_PATTERNS[connection.vendor], line.strip())
+            if match and match.group('table') in CHECKED_TABLES:
+                scanned.append(match.group('table'))
+        return scanned
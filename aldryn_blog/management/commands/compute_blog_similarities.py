@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError, NoArgsCommand
+
+from aldryn_blog.cache import bump_generation, record_blog_change
+from aldryn_blog.models import RelatedTag
+from aldryn_blog.similarity import Similarities
+
+
+class Command(NoArgsCommand):
+    help = ('Computes the related posts and related tags of the whole blog in one pass with numpy and scipy. '
+            'Replaces rebuild_related_posts on large blogs.')
+
+    def handle_noargs(self, **options):
+        try:
+            similarities = Similarities()
+        except ImproperlyConfigured as error:
+            raise CommandError(error)
+        similarities.save()
+        record_blog_change(RelatedTag)
+        bump_generation()
+        self.stdout.write('Computed the similarities of %d posts and %d tags.' % (
+            len(similarities.post_ids), len(similarities.tag_ids)))
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import NoArgsCommand
+
+from aldryn_blog.cache import bump_generation
+from aldryn_blog.menu import ALL_MENUS, get_post_languages, invalidate_menus
+from aldryn_blog.models import (
+    CommandRun, MonthlyPostCount, Post, TagUsageCount, TaggedUnicodeItem, sync_live_posts)
+from aldryn_blog.utils import get_month_bucket, get_now
+
+
+class Command(NoArgsCommand):
+    help = ('Flips the live state and refreshes the blog caches and counts for posts whose publication started or '
+            'ended since the last run. Meant to be run every minute, e.g. from cron.')
+
+    def handle_noargs(self, **options):
+        # the published posts change with the quantized clock, not the real one
+        now = get_now()
+        # the only place flipping the live flags, which the counts below read
+        sync_live_posts(now)
+        since = CommandRun.objects.get_last_run('process_blog_publications')
+        if since is None:
+            # no record of the last run, so refresh everything
+            MonthlyPostCount.objects.rebuild()
+            TagUsageCount.objects.rebuild()
+            invalidate_menus(ALL_MENUS)
+            bump_generation()
+            self.stdout.write('Rebuilt all blog counts.')
+        else:
+            posts = list(Post.objects.get_crossing_publication_boundary(since, now))
+            if posts:
+                self.refresh(posts)
+            self.stdout.write('Refreshed %d blog posts.' % len(posts))
+        CommandRun.objects.set_last_run('process_blog_publications', now)
+
+    def refresh(self, posts):
+        for year, month in set(get_month_bucket(post.publication_start) for post in posts):
+            MonthlyPostCount.objects.refresh_month(year, month)
+
+        tag_ids = TaggedUnicodeItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(Post),
+            object_id__in=[post.pk for post in posts]).values_list('tag', flat=True).distinct()
+        TagUsageCount.objects.refresh_tags(tag_ids)
+
+        languages = set()
+        for post in posts:
+            post_languages = get_post_languages(post)
+            if post_languages is None:
+                languages = None
+                break
+            languages.update(post_languages)
+        invalidate_menus(ALL_MENUS, languages)
+        bump_generation()
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import NoArgsCommand
+
+from aldryn_blog.cache import bump_generation
+from aldryn_blog.models import MonthlyPostCount, PostVisibility, TagUsageCount
+
+
+class Command(NoArgsCommand):
+    help = 'Rebuilds the languages posts are listed in and the materialized blog post counts.'
+
+    def handle_noargs(self, **options):
+        PostVisibility.objects.rebuild()
+        MonthlyPostCount.objects.rebuild()
+        TagUsageCount.objects.rebuild()
+        bump_generation()
+        self.stdout.write('Rebuilt post visibility, monthly post and tag usage counts.')
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from optparse import make_option
+
+from django.core.management.base import CommandError, NoArgsCommand
+from django.db import connections as db_connections
+
+from haystack import connections
+from haystack.exceptions import NotHandled
+
+from aldryn_blog.conf import settings
+from aldryn_blog.models import Post
+
+
+def close_db_connections():
+    # forked workers must not share the database connections of the parent
+    for connection in db_connections.all():
+        connection.close()
+
+
+def index_chunk(chunk):
+    """
+    Indexes the posts of a chunk, given as (alias, first pk, last pk), and
+    returns the chunk along with the amount of posts sent to the backend.
+    """
+    using, start, end = chunk
+    index = connections[using].get_unified_index().get_index(Post)
+    posts = list(index.index_queryset(using=using).filter(pk__gte=start, pk__lte=end))
+    if posts:
+        connections[using].get_backend().update(index, posts)
+    return chunk, len(posts)
+
+
+class Command(NoArgsCommand):
+    help = ('Rebuilds the search index of the published blog posts, split per search connection (language) and per '
+            'range of post ids over a pool of worker processes.')
+    option_list = NoArgsCommand.option_list + (
+        make_option('--workers', type='int', dest='workers', default=multiprocessing.cpu_count(),
+                    help='Amount of worker processes (default: the amount of CPUs).'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=500,
+                    help='Range of post ids indexed by a worker at once (default: 500).'),
+        make_option('--resume', action='store_true', dest='resume', default=False,
+                    help='Continue a failed rebuild, skipping the chunks it completed.'),
+        make_option('--state-file', dest='state_file',
+                    default=os.path.join(tempfile.gettempdir(), 'aldryn_blog_rebuild_index.json'),
+                    help='File recording the completed chunks for --resume.'),
+    )
+
+    def handle_noargs(self, **options):
+        if not settings.ALDRYN_BLOG_SEARCH:
+            self.stdout.write('Blog search is disabled.')
+            return
+        chunk_size, state_file = options['chunk_size'], options['state_file']
+        state = self.load_state(state_file, chunk_size) if options['resume'] else None
+        if state is None:
+            state = {'chunk_size': chunk_size, 'done': []}
+            self.clear()
+        done = set(state['done'])
+
+        chunks = [chunk for chunk in self.get_chunks(chunk_size) if self.get_chunk_name(chunk) not in done]
+        self.stdout.write('Indexing %d chunks (%d already done).' % (len(chunks), len(done)))
+
+        started = time.time()
+        close_db_connections()
+        pool = multiprocessing.Pool(options['workers'], close_db_connections) if options['workers'] > 1 else None
+        try:
+            results = pool.imap_unordered(index_chunk, chunks) if pool else (index_chunk(chunk) for chunk in chunks)
+            for number, (chunk, count) in enumerate(results, 1):
+                state['done'].append(self.get_chunk_name(chunk))
+                self.save_state(state_file, state)
+                self.stdout.write('[%d/%d] %s: indexed %d posts with ids %d to %d (%.1fs)' % (
+                    number, len(chunks), chunk[0], count, chunk[1], chunk[2], time.time() - started))
+        finally:
+            if pool:
+                pool.terminate()
+        if os.path.exists(state_file):
+            os.remove(state_file)
+        self.stdout.write('Rebuilt the blog search index.')
+
+    def get_indexes(self):
+        for using in connections.connections_info:
+            try:
+                yield using, connections[using].get_unified_index().get_index(Post)
+            except NotHandled:
+                continue
+
+    def get_chunks(self, chunk_size):
+        """
+        Returns the (alias, first pk, last pk) ranges holding indexable posts
+        """
+        chunks = []
+        for using, index in self.get_indexes():
+            post_ids = index.index_queryset(using=using).order_by().values_list('pk', flat=True)
+            for number in sorted(set(post_id // chunk_size for post_id in post_ids)):
+                chunks.append((using, number * chunk_size, (number + 1) * chunk_size - 1))
+        return chunks
+
+    def get_chunk_name(self, chunk):
+        return '%s:%d' % (chunk[0], chunk[1])
+
+    def clear(self):
+        for using, index in self.get_indexes():
+            connections[using].get_backend().clear(models=[Post])
+
+    def load_state(self, state_file, chunk_size):
+        if not os.path.exists(state_file):
+            return None
+        with open(state_file) as f:
+            state = json.load(f)
+        if state['chunk_size'] != chunk_size:
+            raise CommandError('The rebuild to resume used a chunk size of %d.' % state['chunk_size'])
+        return state
+
+    def save_state(self, state_file, state):
+        with open(state_file, 'w') as f:
+            json.dump(state, f)
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import NoArgsCommand
+
+from aldryn_blog.models import RelatedPost
+
+
+class Command(NoArgsCommand):
+    help = 'Recomputes the related posts of every blog post.'
+
+    def handle_noargs(self, **options):
+        RelatedPost.objects.rebuild()
+        self.stdout.write('Rebuilt the related blog posts.')
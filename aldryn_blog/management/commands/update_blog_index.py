@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from haystack import connections
+from haystack.exceptions import NotHandled
+
+from aldryn_blog.conf import settings
+from aldryn_blog.models import CommandRun, Post, SearchQueueEntry, sync_live_posts
+from aldryn_blog.utils import get_now
+
+
+class Command(NoArgsCommand):
+    help = ('Updates the search index for the queued blog posts and the posts whose publication started or ended '
+            'since the last run. Meant to be run every few minutes, e.g. from cron.')
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=100,
+                    help='Amount of posts sent to the search backend at once (default: 100).'),
+    )
+
+    def handle_noargs(self, **options):
+        if not settings.ALDRYN_BLOG_SEARCH:
+            self.stdout.write('Blog search is disabled.')
+            return
+        now = get_now()
+        # the index reads Post.published, so its flags must be current for the
+        # posts queued below, even if process_blog_publications did not run yet
+        sync_live_posts(now)
+        since = CommandRun.objects.get_last_run('update_blog_index')
+        if since is None:
+            # first run: catch up with the publications of a bounded look-back window
+            since = now - datetime.timedelta(seconds=settings.ALDRYN_BLOG_GENERATION_TIMEOUT)
+        SearchQueueEntry.objects.enqueue(
+            Post.objects.get_crossing_publication_boundary(since, now).values_list('pk', flat=True))
+
+        count = 0
+        while True:
+            entries = list(SearchQueueEntry.objects.all()[:options['batch_size']])
+            if not entries:
+                break
+            post_ids = set(entry.post_id for entry in entries)
+            self.update(post_ids)
+            # drops the duplicates queued meanwhile, as the batch covers them too
+            SearchQueueEntry.objects.filter(pk__lte=entries[-1].pk, post_id__in=post_ids).delete()
+            count += len(post_ids)
+        CommandRun.objects.set_last_run('update_blog_index', now)
+        self.stdout.write('Updated %d blog posts in the search index.' % count)
+
+    def update(self, post_ids):
+        for using in connections.connections_info:
+            try:
+                index = connections[using].get_unified_index().get_index(Post)
+            except NotHandled:
+                continue
+            backend = connections[using].get_backend()
+            posts = list(index.index_queryset(using=using).filter(pk__in=post_ids))
+            if posts:
+                backend.update(index, posts)
+            # deleted, unpublished and other language posts
+            for post_id in post_ids - set(post.pk for post in posts):
+                backend.remove('%s.%s.%s' % (Post._meta.app_label, Post._meta.model_name, post_id))
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from django.core.management.base import NoArgsCommand
+
+from aldryn_blog.conf import settings
+from aldryn_blog.models import CommandRun, Post, RelatedPost
+from aldryn_blog.utils import get_now
+
+
+class Command(NoArgsCommand):
+    help = ('Refreshes the related posts of the posts changed (including their tags) since the last run, once per '
+            'post. Meant to be run every few minutes, e.g. from cron.')
+
+    def handle_noargs(self, **options):
+        now = get_now()
+        since = CommandRun.objects.get_last_run('update_related_posts')
+        if since is None:
+            since = now - datetime.timedelta(seconds=settings.ALDRYN_BLOG_GENERATION_TIMEOUT)
+        fields = ('pk', 'category_id', 'language', 'publication_start')
+        count = 0
+        for values in Post.objects.filter(updated_at__gte=since).order_by().values_list(*fields).iterator():
+            RelatedPost.objects.refresh_post(Post(**dict(zip(fields, values))))
+            count += 1
+        CommandRun.objects.set_last_run('update_related_posts', now)
+        self.stdout.write('Refreshed the related posts of %d blog posts.' % count)
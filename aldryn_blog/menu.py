@@ -1,20 +1,44 @@
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
-from django.utils.translation import ugettext_lazy as _, get_language_from_request
+from django.utils.translation import ugettext_lazy as _, get_language
 from django.template.defaultfilters import date as _date
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 
 from cms.menu_bases import CMSAttachMenu
+from cms.models import Page
 from menus.base import NavigationNode, Modifier
 from menus.menu_pool import menu_pool
-from aldryn_blog.models import Post, TaggedUnicodeItem
+from taggit.models import Tag
+from aldryn_blog.cache import bump_generation, get_or_set, make_key
+from aldryn_blog.models import AuthorSlug, Category, Post, TaggedUnicodeItem, UniTag
 from aldryn_blog.settings import HIDE_ARCHIVE_MENU, HIDE_CATEGORIES_MENU, HIDE_TAGS_MENU, HIDE_AUTHORS_MENU
-from aldryn_blog.utils import generate_slugs, get_blog_authors
+from aldryn_blog.utils import generate_slugs, get_blog_authors, get_languages
 
 
-class BlogTagsMenu(CMSAttachMenu):
-    name = _("Blog Tags Menu")
+class CachedNodesMixin(object):
+
+    """
+    Caches the nodes of a blog menu per language and site, until the menu's
+    generation for that language is bumped
+    """
+
+    cache_namespace = None
 
     def get_nodes(self, request):
+        language = get_language()
+        site_id = Site.objects.get_current().pk
+        key = make_key(self.__class__.__name__, language, site_id,
+                       namespace=get_menu_namespace(self.cache_namespace, language))
+        return get_or_set(key, lambda: self.build_nodes(request))
+
+
+class BlogTagsMenu(CachedNodesMixin, CMSAttachMenu):
+    name = _("Blog Tags Menu")
+    cache_namespace = 'tags'
+
+    def build_nodes(self, request):
         nodes = []
         tag_menu_id = 'blog-tag-list'
         attributes = {'hidden': HIDE_TAGS_MENU}
@@ -26,12 +50,8 @@ class BlogTagsMenu(CMSAttachMenu):
             tag_menu_id,
             attr=attributes
         ))
-        posts = Post.published.filter_by_current_language()
-        tags = TaggedUnicodeItem.objects.none()
-        for post in posts:
-            tags = tags | TaggedUnicodeItem.tags_for(
-                Post, post).order_by("name")
-        for tag in tags:
+        tags = Post.published.get_tags(language=get_language())
+        for tag in sorted(tags, key=lambda x: x.name):
             node = NavigationNode(
                 tag.name,
                 reverse(
@@ -46,10 +66,11 @@ class BlogTagsMenu(CMSAttachMenu):
         return nodes
 
 
-class BlogArchiveMenu(CMSAttachMenu):
+class BlogArchiveMenu(CachedNodesMixin, CMSAttachMenu):
     name = _("Blog Entries Menu")
+    cache_namespace = 'archive'
 
-    def get_nodes(self, request):
+    def build_nodes(self, request):
         nodes = []
         archives = []
         archive_menu_id = 'blog-archive'
@@ -141,10 +162,11 @@ class BlogArchiveMenu(CMSAttachMenu):
         return nodes
 
 
-class BlogCategoriesMenu(CMSAttachMenu):
+class BlogCategoriesMenu(CachedNodesMixin, CMSAttachMenu):
     name = _("Blog Categories Menu")
+    cache_namespace = 'categories'
 
-    def get_nodes(self, request):
+    def build_nodes(self, request):
         nodes = []
         attributes = {'hidden': HIDE_CATEGORIES_MENU}
         categories_menu_id = 'blog-categories'
@@ -157,8 +179,7 @@ class BlogCategoriesMenu(CMSAttachMenu):
             attr=attributes
         ))
 
-        language = get_language_from_request(request)
-        categories = Post.published.get_categories(language)
+        categories = Category.objects.get_with_usage_count(get_language(), include_empty=False)
         for category in categories:
             category_name = category.lazy_translation_getter('name')
             category_slug = category.lazy_translation_getter('slug')
@@ -180,10 +201,11 @@ class BlogCategoriesMenu(CMSAttachMenu):
         return nodes
 
 
-class BlogAuthorsMenu(CMSAttachMenu):
+class BlogAuthorsMenu(CachedNodesMixin, CMSAttachMenu):
     name = _("Blog Authors Menu")
+    cache_namespace = 'authors'
 
-    def get_nodes(self, request):
+    def build_nodes(self, request):
         nodes = []
         attributes = {'hidden': HIDE_AUTHORS_MENU}
         authors_menu_id = 'blog-authors'
@@ -241,16 +263,146 @@ menu_pool.register_menu(BlogAuthorsMenu)
 menu_pool.register_modifier(BlogEntryModifier)
 
 
-def invalidate_menu_cache(sender, **kwargs):
+ALL_MENUS = ['archive', 'tags', 'categories', 'authors']
+# the post fields each menu shows or counts, besides is_live and the language
+MENU_POST_FIELDS = {
+    'archive': ('publication_start', 'title', 'slug'),
+    'tags': (),
+    'categories': ('category_id',),
+    'authors': ('author_id',),
+}
+USER_NAME_FIELDS = ('first_name', 'last_name', 'username')
+
+
+def get_menu_namespace(menu, language):
+    return 'menu-%s-%s' % (menu, language)
+
+
+def invalidate_menus(menus, languages=None):
+    """
+    Drops the cached nodes of the given blog menus and the menu_pool cache
+    of the sites with a blog page for the given languages (all languages by
+    default)
+    """
+    if not menus:
+        return
+    site_ids = set(Page.objects.filter(application_urls='BlogApp').values_list('site', flat=True))
+    for language in languages or get_languages():
+        for menu in menus:
+            bump_generation(get_menu_namespace(menu, language))
+        for site_id in site_ids:
+            menu_pool.clear(site_id=site_id, language=language)
+
+
+def get_post_languages(post):
+    languages = set([post.language])
+    old_state = getattr(post, '_aldryn_blog_old_state', None)
+    if old_state:
+        languages.add(old_state[2])
+    if None in languages:
+        return None
+    return languages
+
+
+def get_changed_menus(post):
+    """
+    Returns the menus showing a saved post differently than before
+    """
+    old = getattr(post, '_aldryn_blog_old_fields', None)
+    if not old:
+        return ALL_MENUS if post.is_live else []
+    if not old['is_live'] and not post.is_live:
+        return []
+    if old['is_live'] != post.is_live or old['language'] != post.language:
+        return ALL_MENUS
+    return [menu for menu in ALL_MENUS
+            if any(old[field] != getattr(post, field) for field in MENU_POST_FIELDS[menu])]
+
+
+def invalidate_post_menus(sender, instance, raw=False, **kwargs):
+    """
+    Signal receiver to invalidate the blog menus
+    when an entry is posted
+    """
+    if raw:
+        return
+    invalidate_menus(get_changed_menus(instance), get_post_languages(instance))
+
+
+def invalidate_deleted_post_menus(sender, instance, **kwargs):
+    if instance.is_live:
+        invalidate_menus(ALL_MENUS, get_post_languages(instance))
+
+
+def invalidate_post_tags_menus(sender, instance, raw=False, **kwargs):
+    if raw or instance.content_type_id != ContentType.objects.get_for_model(Post).pk:
+        return
+    try:
+        post = Post.objects.get(pk=instance.object_id)
+    except Post.DoesNotExist:
+        return
+    if post.is_live:
+        invalidate_menus(['tags'], get_post_languages(post))
+
+
+def invalidate_tags_menus(sender, raw=False, created=False, **kwargs):
+    # a new tag is only listed once a post is tagged with it
+    if not raw and not created:
+        invalidate_menus(['tags'])
+
+
+def invalidate_categories_menus(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_menus(['categories'], [instance.language_code])
+
+
+def remember_author_name(sender, instance, raw=False, update_fields=None, **kwargs):
     """
-    Signal receiver to invalidate the menu_pool
-    cache when an entry is posted
+    Remembers the name of a blog author about to be saved. Saves not touching
+    the name (e.g. of last_login on every login) and other users are skipped.
     """
-    menu_pool.clear()
+    instance._aldryn_blog_old_name = None
+    if raw or not instance.pk or (update_fields is not None and not set(update_fields) & set(USER_NAME_FIELDS)):
+        return
+    if AuthorSlug.objects.filter(user=instance.pk).exists():
+        instance._aldryn_blog_old_name = User.objects.filter(pk=instance.pk).values_list(*USER_NAME_FIELDS).first()
+
+
+def invalidate_authors_menus(sender, instance, raw=False, **kwargs):
+    old_name = getattr(instance, '_aldryn_blog_old_name', None)
+    if not raw and old_name and old_name != tuple(getattr(instance, field) for field in USER_NAME_FIELDS):
+        invalidate_menus(['authors'])
+
+
+def invalidate_coauthors_menus(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_menus(['authors'], None if reverse else get_post_languages(instance))
+
 
 post_save.connect(
-    invalidate_menu_cache, sender=Post,
+    invalidate_post_menus, sender=Post,
     dispatch_uid='aldryn_blog.post.postsave.invalidate_menu_cache')
 post_delete.connect(
-    invalidate_menu_cache, sender=Post,
+    invalidate_deleted_post_menus, sender=Post,
     dispatch_uid='aldryn_blog.post.postdelete.invalidate_menu_cache')
+for signal in (post_save, post_delete):
+    signal_name = 'postsave' if signal is post_save else 'postdelete'
+    signal.connect(
+        invalidate_post_tags_menus, sender=TaggedUnicodeItem,
+        dispatch_uid='aldryn_blog.taggedunicodeitem.%s.invalidate_menu_cache' % signal_name)
+    signal.connect(
+        invalidate_categories_menus, sender=Category._meta.translations_model,
+        dispatch_uid='aldryn_blog.categorytranslation.%s.invalidate_menu_cache' % signal_name)
+    for model in (Tag, UniTag):
+        signal.connect(
+            invalidate_tags_menus, sender=model,
+            dispatch_uid='aldryn_blog.%s.%s.invalidate_menu_cache' % (model.__name__.lower(), signal_name))
+pre_save.connect(
+    remember_author_name, sender=User,
+    dispatch_uid='aldryn_blog.user.presave.remember_author_name')
+post_save.connect(
+    invalidate_authors_menus, sender=User,
+    dispatch_uid='aldryn_blog.user.postsave.invalidate_menu_cache')
+m2m_changed.connect(
+    invalidate_coauthors_menus, sender=Post.coauthors.through,
+    dispatch_uid='aldryn_blog.post.m2mchanged.invalidate_menu_cache')
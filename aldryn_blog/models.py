@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 import datetime
+import heapq
+import re
 from collections import Counter
 
-from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.core.urlresolvers import reverse, NoReverseMatch
-from django.db import models
-from django.db.models import Q
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Q
 from django.template.defaultfilters import slugify
 from django.utils import timezone, six
 from django.utils.translation import get_language, ugettext_lazy as _, override
@@ -13,6 +17,7 @@ from django.template.defaultfilters import slugify as default_slugify
 
 from app_data import AppDataField
 from cms.utils.i18n import get_current_language
+from cms.models import Page
 from cms.models.fields import PlaceholderField
 from cms.models.pluginmodel import CMSPlugin
 from djangocms_text_ckeditor.fields import HTMLField
@@ -22,8 +27,12 @@ from taggit.managers import TaggableManager
 from taggit.models import GenericTaggedItemBase, ItemBase, Tag
 from unidecode import unidecode
 
+from .cache import (
+    bump_generation, get_or_set, invalidate_blog_cache, invalidate_pages_cache, make_key, record_blog_change)
 from .conf import settings
-from .utils import generate_slugs, get_blog_authors, get_slug_for_user, get_slug_in_language
+from .utils import (
+    generate_slugs, get_blog_authors, get_bucket_end, get_bucket_start, get_date_range, get_languages,
+    get_month_bucket, get_now, get_slug_for_user, get_slug_in_language)
 
 AUTH_USER_MODEL = getattr(settings, 'AUTH_USER_MODEL', 'auth.User')
 
@@ -53,18 +62,38 @@ class TaggedUnicodeItem(GenericTaggedItemBase, ItemBase):
         UniTag, related_name="%(app_label)s_%(class)s_items")
 
     class Meta:
+        index_together = [('content_type', 'object_id')]
         verbose_name = _("UniTagged Item")
         verbose_name_plural = _("UniTagged Items")
 
 
 class CategoryManager(TranslationManager):
 
-    def get_with_usage_count(self, language=None, **kwargs):
-        categories = list(self.language(language).filter(**kwargs).distinct())
-
-        # No annotate in hvad
+    def get_with_usage_count(self, language=None, include_empty=True, **kwargs):
+        """
+        Returns the categories translated in language with the amount of
+        published posts visible in that language, ordered by amount.
+        """
+        language = language or get_language()
+        if kwargs:
+            return self._get_with_usage_count(language, include_empty, **kwargs)
+        key = make_key('categories-with-usage-count', language, include_empty)
+        return get_or_set(key, lambda: self._get_with_usage_count(language, include_empty))
+
+    def _get_with_usage_count(self, language, include_empty, **kwargs):
+        # No annotate in hvad, so the counts are aggregated on the posts
+        counts = dict(Post.published.filter_by_language(language)
+                                    .filter(category__isnull=False)
+                                    .order_by()
+                                    .values('category')
+                                    .annotate(count=models.Count('pk'))
+                                    .values_list('category', 'count'))
+        categories = self.language(language).filter(**kwargs)
+        if not include_empty:
+            categories = categories.filter(pk__in=counts.keys())
+        categories = list(categories)
         for category in categories:
-            category.post_count = category.post_set.count()
+            category.count = category.post_count = counts.get(category.pk, 0)
         return sorted(categories, key=lambda x: -x.post_count)
 
 
@@ -79,6 +108,7 @@ class Category(TranslatableModel):
     )
 
     ordering = models.IntegerField(_('Ordering'), default=0)
+    updated_at = models.DateTimeField(_('Updated'), auto_now=True, db_index=True)
 
     objects = CategoryManager()
 
@@ -112,13 +142,52 @@ class RelatedManager(models.Manager):
 
     def filter_by_language(self, language):
         qs = self.get_query_set()
-        return qs.filter(Q(language__isnull=True) | Q(language=language))
+        return qs.filter(visibility__language=language)
 
     def filter_by_current_language(self):
         return self.filter_by_language(get_language())
 
+    def get_next_publication_boundary(self, language=None):
+        """
+        Returns the next moment a post enters or leaves the publication window
+        """
+        now = get_now()
+        entries = self.filter_by_language(language) if language else self.get_query_set()
+        start = entries.filter(publication_start__gt=now).aggregate(
+            boundary=models.Min('publication_start'))['boundary']
+        end = entries.filter(publication_end__gte=now).aggregate(
+            boundary=models.Min('publication_end'))['boundary']
+        # with a quantized now, posts only enter or leave at time bucket edges
+        boundaries = []
+        if start is not None:
+            boundaries.append(get_bucket_start(start))
+        if end is not None:
+            boundaries.append(get_bucket_end(end))
+        return min(boundaries) if boundaries else None
+
+    def get_crossing_publication_boundary(self, since, until):
+        """
+        Returns the posts that entered or left the publication window between since and until
+        """
+        return self.filter(
+            Q(publication_start__gt=since, publication_start__lte=until) |
+            Q(publication_end__gte=since, publication_end__lt=until))
+
+    def _get_cache_key(self, *bits):
+        # related managers (e.g. category.post_set) subclass the default
+        # manager but are filtered, so only the model managers are cached
+        if type(self) not in (RelatedManager, PublishedManager):
+            return None
+        return make_key(type(self).__name__, *bits)
+
     def get_tags(self, entries=None, language=None):
         """Returns tags used to tag post and its count. Results are ordered by count."""
+        key = None if entries is not None else self._get_cache_key('tags', language)
+        if key is None:
+            return self._get_tags(entries, language)
+        return get_or_set(key, lambda: self._get_tags(entries, language))
+
+    def _get_tags(self, entries=None, language=None):
         if not entries:
             entries = self
 
@@ -146,6 +215,12 @@ class RelatedManager(models.Manager):
         """
         Returns all categories used in posts and the amount, ordered by amount.
         """
+        key = self._get_cache_key('categories', language)
+        if key is None:
+            return self._get_categories(language)
+        return get_or_set(key, lambda: list(self._get_categories(language)))
+
+    def _get_categories(self, language=None):
         entries = (self.filter_by_language(
             language) if language else self).distinct()
         if not entries:
@@ -156,7 +231,12 @@ class RelatedManager(models.Manager):
         """
         Get months with aggregated count (how much posts is in the month). Results are ordered by date.
         """
+        key = self._get_cache_key('months', language)
+        if key is None:
+            return self._get_months(language)
+        return get_or_set(key, lambda: self._get_months(language))
 
+    def _get_months(self, language):
         # done via naive way as django's having tough time while aggregating on
         # date fields
         entries = self.filter_by_language(language)
@@ -169,15 +249,41 @@ class RelatedManager(models.Manager):
                  'count': date_counter[year, month]} for year, month in dates]
 
 
+def get_live_filter(now):
+    return Q(publication_start__lte=now) & (Q(publication_end__isnull=True) | Q(publication_end__gte=now))
+
+
+def sync_live_posts(now=None):
+    """
+    Flips is_live of the posts whose publication started or ended by now
+    (defaults to the current time bucket). Returns the amount of posts
+    flipped.
+    """
+    now = now or get_now()
+    changed = Post.objects.filter(get_live_filter(now), is_live=False).update(is_live=True)
+    changed += Post.objects.filter(
+        Q(publication_start__gt=now) | Q(publication_end__lt=now), is_live=True).update(is_live=False)
+    if changed:
+        bump_generation()
+    return changed
+
+
 class PublishedManager(RelatedManager):
 
     def get_query_set(self):
-        qs = super(PublishedManager, self).get_query_set()
-        now = timezone.now()
-        qs = qs.filter(publication_start__lte=now)
-        qs = qs.filter(
-            Q(publication_end__isnull=True) | Q(publication_end__gte=now))
-        return qs
+        return super(PublishedManager, self).get_query_set().filter(is_live=True)
+
+    def _get_tags(self, entries=None, language=None):
+        # read from the materialized counts, which only exist per configured language
+        if entries is None and language in get_languages():
+            return TagUsageCount.objects.get_tags(language)
+        return super(PublishedManager, self)._get_tags(entries, language)
+
+    def _get_months(self, language):
+        # read from the materialized counts, which only exist per configured language
+        if language in get_languages():
+            return MonthlyPostCount.objects.get_months(language)
+        return super(PublishedManager, self)._get_months(language)
 
 
 class Post(models.Model):
@@ -197,12 +303,15 @@ class Post(models.Model):
     author = models.ForeignKey(to=AUTH_USER_MODEL, verbose_name=_('Author'))
     coauthors = models.ManyToManyField(
         to=AUTH_USER_MODEL, verbose_name=_('Co-Authors'), null=True, blank=True, related_name='aldryn_blog_coauthors')
-    publication_start = models.DateTimeField(_('Published Since'), default=timezone.now,
+    publication_start = models.DateTimeField(_('Published Since'), default=timezone.now, db_index=True,
                                              help_text=_('Used in the URL. If changed, the URL will change.'))
     publication_end = models.DateTimeField(
-        _('Published Until'), null=True, blank=True)
+        _('Published Until'), null=True, blank=True, db_index=True)
     category = models.ForeignKey(
         Category, verbose_name=_('Category'), null=True, blank=True)
+    updated_at = models.DateTimeField(_('Updated'), auto_now=True, db_index=True)
+    # set by save() and flipped by the periodic commands, read by Post.published
+    is_live = models.BooleanField(_('Live'), default=False, editable=False)
 
     objects = RelatedManager()
     published = PublishedManager()
@@ -224,6 +333,9 @@ class Post(models.Model):
 
     class Meta:
         ordering = ['-publication_start']
+        # the public lists filter published posts (joined to their visibility
+        # by language) or a category and sort by publication start
+        index_together = [('is_live', 'publication_start'), ('category', 'publication_start')]
         verbose_name = _('Post')
         verbose_name_plural = _('Posts')
 
@@ -244,10 +356,17 @@ class Post(models.Model):
     def save(self, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        self.is_live = self.get_is_live()
         return super(Post, self).save(**kwargs)
 
+    def get_is_live(self, now=None):
+        """
+        Returns whether the post is in its publication window
+        """
+        now = now or get_now()
+        return self.publication_start <= now and (self.publication_end is None or self.publication_end >= now)
+
     def get_author_slug(self):
-        # FIXME: This is a potential performance hogger
         return get_slug_for_user(self.author)
 
 
@@ -275,6 +394,484 @@ class LatestEntriesPlugin(CMSPlugin):
         return posts[:self.latest_entries]
 
 
+class PostVisibilityManager(models.Manager):
+
+    def get_languages(self, language):
+        return [language] if language else get_languages()
+
+    def refresh_post(self, post):
+        """
+        Stores the languages the given post is listed in.
+        """
+        languages = set(self.get_languages(post.language))
+        existing = set(self.filter(post=post).values_list('language', flat=True))
+        if existing - languages:
+            self.filter(post=post, language__in=existing - languages).delete()
+        self.bulk_create([self.model(post_id=post.pk, language=language) for language in languages - existing])
+
+    def rebuild(self):
+        """
+        Stores the languages of all posts, e.g. after settings.LANGUAGES changed.
+        """
+        rows = []
+        for pk, post_language in Post.objects.values_list('pk', 'language'):
+            rows.extend(self.model(post_id=pk, language=language) for language in self.get_languages(post_language))
+        self.all().delete()
+        self.bulk_create(rows)
+
+
+class PostVisibility(models.Model):
+
+    """
+    A language a post is listed in: its own one, or every language of the
+    site for posts without one. Lets the public queries select the posts of
+    a language with one index lookup instead of "language IS NULL OR language = X".
+    """
+
+    post = models.ForeignKey(Post, verbose_name=_('Post'), related_name='visibility')
+    language = models.CharField(_('language'), max_length=15)
+
+    objects = PostVisibilityManager()
+
+    class Meta:
+        unique_together = [('language', 'post')]
+        verbose_name = _('Post Visibility')
+        verbose_name_plural = _('Post Visibilities')
+
+    def __unicode__(self):
+        return u'%s %s' % (self.language, self.post_id)
+
+
+class MonthlyPostCountManager(models.Manager):
+
+    def get_months(self, language):
+        rows = self.filter(language=language, count__gt=0).values_list('year', 'month', 'count')
+        return [{'date': datetime.date(year=year, month=month, day=1),
+                 'count': count} for year, month, count in rows]
+
+    def get_count(self, language, year=None, month=None):
+        """
+        Returns the amount of published posts in the given language, year or
+        month, summed from the monthly counts.
+        """
+        rows = self.filter(language=language)
+        if year:
+            rows = rows.filter(year=year)
+        if month:
+            rows = rows.filter(month=month)
+        return rows.aggregate(count=models.Sum('count'))['count'] or 0
+
+    def refresh_month(self, year, month):
+        """
+        Recounts the published posts of the given month for every language.
+        """
+        start, end = get_date_range(year, month, tz=timezone.get_default_timezone())
+        for language in get_languages():
+            count = (Post.published.filter_by_language(language)
+                                   .filter(publication_start__gte=start, publication_start__lt=end)
+                                   .count())
+            updated = self.filter(language=language, year=year, month=month).update(count=count)
+            if not updated and count:
+                self.create(language=language, year=year, month=month, count=count)
+
+    def rebuild(self):
+        """
+        Recounts the published posts of all months for every language.
+        """
+        rows = []
+        for language in get_languages():
+            dates = Post.published.filter_by_language(language).values_list('publication_start', flat=True)
+            counter = Counter(get_month_bucket(date) for date in dates)
+            rows.extend(self.model(language=language, year=year, month=month, count=count)
+                        for (year, month), count in counter.items())
+        self.all().delete()
+        self.bulk_create(rows)
+
+
+class MonthlyPostCount(models.Model):
+
+    """
+    Materialized amount of published posts per language and month, read by the archive
+    """
+
+    language = models.CharField(_('language'), max_length=15)
+    year = models.IntegerField(_('Year'))
+    month = models.IntegerField(_('Month'))
+    count = models.PositiveIntegerField(_('Count'), default=0)
+
+    objects = MonthlyPostCountManager()
+
+    class Meta:
+        ordering = ['-year', '-month']
+        unique_together = [['language', 'year', 'month']]
+        verbose_name = _('Monthly Post Count')
+        verbose_name_plural = _('Monthly Post Counts')
+
+    def __unicode__(self):
+        return u'%s %04d-%02d: %d' % (self.language, self.year, self.month, self.count)
+
+
+class TagUsageCountManager(models.Manager):
+
+    def get_tags(self, language):
+        rows = self.filter(language=language, count__gt=0).select_related('tag')
+        tags = []
+        for row in rows:
+            row.tag.count = row.count
+            tags.append(row.tag)
+        return tags
+
+    def _get_counts(self, language, tag_ids=None):
+        published = Post.published.filter_by_language(language).values('pk')
+        items = TaggedUnicodeItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(Post), object_id__in=published)
+        if tag_ids is not None:
+            items = items.filter(tag__in=tag_ids)
+        return dict(items.values('tag')
+                         .annotate(count=models.Count('object_id', distinct=True))
+                         .values_list('tag', 'count'))
+
+    def refresh_tags(self, tag_ids):
+        """
+        Recounts the published posts using the given tags for every language.
+        """
+        tag_ids = list(tag_ids)
+        if not tag_ids:
+            return
+        for language in get_languages():
+            counts = self._get_counts(language, tag_ids)
+            for tag_id in tag_ids:
+                count = counts.get(tag_id, 0)
+                updated = self.filter(language=language, tag=tag_id).update(count=count)
+                if not updated and count:
+                    self.create(language=language, tag_id=tag_id, count=count)
+
+    def rebuild(self):
+        """
+        Recounts the published posts using any tag for every language.
+        """
+        rows = []
+        for language in get_languages():
+            rows.extend(self.model(language=language, tag_id=tag_id, count=count)
+                        for tag_id, count in self._get_counts(language).items())
+        self.all().delete()
+        self.bulk_create(rows)
+
+
+class TagUsageCount(models.Model):
+
+    """
+    Materialized amount of published posts per language using a tag, read by the tag cloud
+    """
+
+    tag = models.ForeignKey(UniTag, verbose_name=_('Tag'), related_name='aldryn_blog_usage_counts')
+    language = models.CharField(_('language'), max_length=15)
+    count = models.PositiveIntegerField(_('Count'), default=0)
+
+    objects = TagUsageCountManager()
+
+    class Meta:
+        ordering = ['-count']
+        unique_together = [['tag', 'language']]
+        index_together = [['language', 'count']]
+        verbose_name = _('Tag Usage Count')
+        verbose_name_plural = _('Tag Usage Counts')
+
+    def __unicode__(self):
+        return u'%s %s: %d' % (self.language, self.tag_id, self.count)
+
+
+class AuthorSlugManager(models.Manager):
+
+    def get_base_slug(self, user):
+        return slugify(user.get_full_name()) or user.get_username()
+
+    def get_slug_for_user(self, user):
+        try:
+            return self.get(user=user).slug
+        except self.model.DoesNotExist:
+            return self.create_for_user(user).slug
+
+    def create_for_user(self, user, retries=3):
+        """
+        Registers a slug for the user. Concurrent requests may register the
+        same user or pick the same slug, so a clash is looked up or retried.
+        """
+        for attempt in range(retries):
+            author_slug = self.model(user=user, slug=self.generate_slug(user))
+            try:
+                with transaction.atomic():
+                    author_slug.save()
+                return author_slug
+            except IntegrityError:
+                try:
+                    return self.get(user=user)
+                except self.model.DoesNotExist:
+                    if attempt == retries - 1:
+                        raise
+
+    def generate_slug(self, user):
+        """
+        Returns a free slug for the user, adding a numeric suffix when the
+        name-based slug is taken by another author.
+        """
+        base = self.get_base_slug(user)
+        taken = set(self.filter(slug__startswith=base).exclude(user=user).values_list('slug', flat=True))
+        if base not in taken:
+            return base
+        for i in xrange(2, 100):
+            slug = '%s-%i' % (base, i)
+            if slug not in taken:
+                return slug
+        return user.get_username()
+
+    def get_slugs(self, users):
+        """
+        Returns a dict mapping user ids to slugs, registering the users that
+        don't have one yet.
+        """
+        users = list(users)
+        slugs = dict(self.filter(user__in=[user.pk for user in users]).values_list('user', 'slug'))
+        for user in users:
+            if user.pk not in slugs:
+                slugs[user.pk] = self.create_for_user(user).slug
+        return slugs
+
+    def update_for_user(self, user):
+        """
+        Regenerates the slug of a registered user whose name has changed.
+        """
+        try:
+            author_slug = self.get(user=user)
+        except self.model.DoesNotExist:
+            return
+        base = self.get_base_slug(user)
+        if re.match(r'^%s(-\d+)?$' % re.escape(base), author_slug.slug):
+            return
+        author_slug.slug = self.generate_slug(user)
+        author_slug.save()
+
+
+class AuthorSlug(models.Model):
+
+    """
+    Stable, unique slugs for blog authors, used in the author URLs
+    """
+
+    user = models.OneToOneField(to=AUTH_USER_MODEL, verbose_name=_('User'), related_name='aldryn_blog_slug')
+    slug = models.CharField(_('Slug'), max_length=255, unique=True)
+
+    objects = AuthorSlugManager()
+
+    class Meta:
+        verbose_name = _('Author Slug')
+        verbose_name_plural = _('Author Slugs')
+
+    def __unicode__(self):
+        return self.slug
+
+
+class SearchQueueEntryManager(models.Manager):
+
+    def enqueue(self, post_ids):
+        self.bulk_create([self.model(post_id=post_id) for post_id in set(post_ids)])
+
+
+class SearchQueueEntry(models.Model):
+
+    """
+    A post waiting to be updated in (or removed from) the search index
+    """
+
+    post_id = models.IntegerField(_('Post ID'))
+    queued_at = models.DateTimeField(_('Queued at'), auto_now_add=True)
+
+    objects = SearchQueueEntryManager()
+
+    class Meta:
+        ordering = ['pk']
+        verbose_name = _('Search Queue Entry')
+        verbose_name_plural = _('Search Queue Entries')
+
+    def __unicode__(self):
+        return six.text_type(self.post_id)
+
+
+class CommandRunManager(models.Manager):
+
+    def get_last_run(self, command):
+        return self.filter(command=command).values_list('last_run', flat=True).first()
+
+    def set_last_run(self, command, moment):
+        if not self.filter(command=command).update(last_run=moment):
+            self.create(command=command, last_run=moment)
+
+
+class CommandRun(models.Model):
+
+    """
+    When a periodic blog command last ran. Kept in the database rather than
+    the cache, so eviction or a per-process cache never loses it.
+    """
+
+    command = models.CharField(_('Command'), max_length=100, unique=True)
+    last_run = models.DateTimeField(_('Last run'))
+
+    objects = CommandRunManager()
+
+    class Meta:
+        verbose_name = _('Command Run')
+        verbose_name_plural = _('Command Runs')
+
+    def __unicode__(self):
+        return self.command
+
+
+def get_related_score(same_category, tag_similarity, days_apart):
+    """
+    Scores how related two posts are: one point for the same category, up to
+    one for the similarity of their tags and up to one for being published
+    close to each other. Works on numbers as well as on numpy arrays.
+    """
+    return same_category * 1.0 + tag_similarity + 1 / (1 + days_apart / 30.0)
+
+
+class RelatedPostManager(models.Manager):
+
+    def get_scores(self, post, limit=None):
+        """
+        Returns a dict of post id: (score, same category, shared tags) for the
+        candidates in the language of post, selected and limited by the
+        database: the posts sharing most of its tags and the ones published
+        closest to it in its category.
+        """
+        limit = limit or settings.ALDRYN_BLOG_RELATED_POSTS_LIMIT
+        post_type = ContentType.objects.get_for_model(Post)
+        tag_ids = list(TaggedUnicodeItem.objects.filter(
+            content_type=post_type, object_id=post.pk).values_list('tag', flat=True))
+        posts = Post.objects.filter(language=post.language).exclude(pk=post.pk).order_by()
+        fields = ('pk', 'category', 'publication_start')
+
+        candidates, shared_tags = {}, {}
+        if tag_ids:
+            tagged = posts.filter(tags__in=tag_ids).annotate(shared_tags=Count('tags'))
+            for values in tagged.order_by('-shared_tags', '-publication_start').values_list(
+                    *(fields + ('shared_tags',)))[:2 * limit]:
+                candidates[values[0]] = values[1:3]
+                shared_tags[values[0]] = values[3]
+        if post.category_id:
+            in_category = posts.filter(category=post.category_id)
+            nearest = [
+                in_category.filter(publication_start__lte=post.publication_start).order_by('-publication_start'),
+                in_category.filter(publication_start__gt=post.publication_start).order_by('publication_start'),
+            ]
+            unknown = []
+            for queryset in nearest:
+                for values in queryset.values_list(*fields)[:limit]:
+                    if values[0] not in candidates:
+                        candidates[values[0]] = values[1:3]
+                        unknown.append(values[0])
+            if tag_ids and unknown:
+                shared_tags.update(TaggedUnicodeItem.objects.filter(
+                    content_type=post_type, object_id__in=unknown, tag__in=tag_ids).values('object_id').annotate(
+                    count=Count('pk')).order_by().values_list('object_id', 'count'))
+        tag_counts = dict(TaggedUnicodeItem.objects.filter(
+            content_type=post_type, object_id__in=list(shared_tags)).values('object_id').annotate(
+            count=Count('pk')).order_by().values_list('object_id', 'count')) if shared_tags else {}
+
+        scores = {}
+        for pk, (category_id, publication_start) in candidates.items():
+            same_category = bool(post.category_id) and category_id == post.category_id
+            tags = shared_tags.get(pk, 0)
+            # cosine similarity of the tags of both posts
+            similarity = tags / (len(tag_ids) * tag_counts[pk]) ** 0.5 if tags else 0.0
+            days_apart = abs((post.publication_start - publication_start).total_seconds()) / 86400
+            scores[pk] = (get_related_score(same_category, similarity, days_apart), same_category, tags)
+        return scores
+
+    def set_related(self, post_id, scores):
+        """
+        Replaces the related posts of a post with the best scored ones
+        """
+        best = heapq.nlargest(settings.ALDRYN_BLOG_RELATED_POSTS_LIMIT, scores.items(), key=lambda item: item[1][0])
+        self.filter(post=post_id).delete()
+        self.bulk_create([
+            self.model(post_id=post_id, related_id=pk, score=score, same_category=same_category, shared_tags=tags)
+            for pk, (score, same_category, tags) in best])
+        return best
+
+    def refresh_post(self, post):
+        """
+        Recomputes the related posts of post and puts it into the lists of
+        those posts. Lists of other posts it drops out of are completed by
+        the next rebuild.
+        """
+        best = self.set_related(post.pk, self.get_scores(post))
+        self.filter(related=post).delete()
+        self.bulk_create([
+            self.model(post_id=pk, related=post, score=score, same_category=same_category, shared_tags=tags)
+            for pk, (score, same_category, tags) in best])
+        # every list got at most one entry, which may push out its lowest one
+        full = self.filter(post__in=[pk for pk, values in best]).values('post').annotate(
+            count=Count('pk')).filter(count__gt=settings.ALDRYN_BLOG_RELATED_POSTS_LIMIT).values_list('post', flat=True)
+        for post_id in list(full):
+            self.filter(post=post_id).order_by('score', 'pk')[0].delete()
+
+    def rebuild(self):
+        fields = ('pk', 'category_id', 'language', 'publication_start')
+        for values in Post.objects.order_by().values_list(*fields).iterator():
+            post = Post(**dict(zip(fields, values)))
+            self.set_related(post.pk, self.get_scores(post))
+
+
+class RelatedPost(models.Model):
+
+    """
+    A post related to another one by category, tags and publication date
+    """
+
+    post = models.ForeignKey(Post, verbose_name=_('Post'), related_name='related_posts')
+    related = models.ForeignKey(Post, verbose_name=_('Related Post'), related_name='related_by')
+    score = models.FloatField(_('Score'))
+    same_category = models.BooleanField(_('Same Category'), default=False)
+    shared_tags = models.PositiveIntegerField(_('Shared Tags'), default=0)
+
+    objects = RelatedPostManager()
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = [('post', 'related')]
+        index_together = [('post', 'score')]
+        verbose_name = _('Related Post')
+        verbose_name_plural = _('Related Posts')
+
+    def __unicode__(self):
+        return u'%s - %s' % (self.post_id, self.related_id)
+
+
+class RelatedTag(models.Model):
+
+    """
+    A tag often used together with another one, scored by the cosine
+    similarity of the posts using them
+    """
+
+    tag = models.ForeignKey(UniTag, verbose_name=_('Tag'), related_name='aldryn_blog_related_tags')
+    related = models.ForeignKey(UniTag, verbose_name=_('Related Tag'), related_name='aldryn_blog_related_by')
+    score = models.FloatField(_('Score'))
+    count = models.PositiveIntegerField(_('Shared Posts'))
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = [('tag', 'related')]
+        index_together = [('tag', 'score')]
+        verbose_name = _('Related Tag')
+        verbose_name_plural = _('Related Tags')
+
+    def __unicode__(self):
+        return u'%s - %s' % (self.tag_id, self.related_id)
+
+
 class AuthorsPlugin(CMSPlugin):
 
     def get_authors(self):
@@ -288,3 +885,236 @@ def force_language(sender, instance, **kwargs):
 
 for model in CMSPlugin.__subclasses__():
     models.signals.pre_save.connect(force_language, sender=model)
+
+
+def register_post_authors(sender, instance, **kwargs):
+    AuthorSlug.objects.get_slugs([instance.author])
+
+
+def register_post_coauthors(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or reverse or not pk_set:
+        return
+    AuthorSlug.objects.get_slugs(instance.coauthors.filter(pk__in=pk_set))
+
+
+def update_author_slug(sender, instance, **kwargs):
+    AuthorSlug.objects.update_for_user(instance)
+
+
+models.signals.post_save.connect(
+    register_post_authors, sender=Post,
+    dispatch_uid='aldryn_blog.post.postsave.register_post_authors')
+models.signals.m2m_changed.connect(
+    register_post_coauthors, sender=Post.coauthors.through,
+    dispatch_uid='aldryn_blog.post.m2mchanged.register_post_coauthors')
+models.signals.post_save.connect(
+    update_author_slug, sender=User,
+    dispatch_uid='aldryn_blog.user.postsave.update_author_slug')
+
+
+def refresh_post_visibility(sender, instance, **kwargs):
+    PostVisibility.objects.refresh_post(instance)
+
+
+# connected first, the other receivers select the posts of a language
+models.signals.post_save.connect(
+    refresh_post_visibility, sender=Post,
+    dispatch_uid='aldryn_blog.post.postsave.refresh_post_visibility')
+
+
+# the fields the blog menus are built from, besides the publication state
+LISTED_FIELDS = ('is_live', 'category_id', 'author_id', 'title', 'slug')
+
+
+def remember_publication_state(sender, instance, raw=False, **kwargs):
+    instance._aldryn_blog_old_state = instance._aldryn_blog_old_fields = None
+    if instance.pk and not raw:
+        fields = ('publication_start', 'publication_end', 'language') + LISTED_FIELDS
+        old = Post.objects.filter(pk=instance.pk).values_list(*fields)
+        if old:
+            instance._aldryn_blog_old_state = old[0][:3]
+            instance._aldryn_blog_old_fields = dict(zip(fields, old[0]))
+
+
+def get_publication_state(post):
+    return post.publication_start, post.publication_end, post.language
+
+
+def refresh_monthly_post_count(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    months = set([get_month_bucket(instance.publication_start)])
+    old_state = getattr(instance, '_aldryn_blog_old_state', None)
+    if old_state:
+        months.add(get_month_bucket(old_state[0]))
+    for year, month in months:
+        MonthlyPostCount.objects.refresh_month(year, month)
+
+
+def refresh_post_tag_usage_count(sender, instance, raw=False, **kwargs):
+    if raw or getattr(instance, '_aldryn_blog_old_state', None) == get_publication_state(instance):
+        return
+    TagUsageCount.objects.refresh_tags(instance.tags.values_list('pk', flat=True))
+
+
+def remember_post_tags(sender, instance, **kwargs):
+    instance._aldryn_blog_old_tags = list(instance.tags.values_list('pk', flat=True))
+
+
+def refresh_deleted_post_tag_usage_count(sender, instance, **kwargs):
+    TagUsageCount.objects.refresh_tags(getattr(instance, '_aldryn_blog_old_tags', []))
+
+
+def refresh_tag_usage_count(sender, instance, raw=False, **kwargs):
+    if raw or instance.content_type_id != ContentType.objects.get_for_model(Post).pk:
+        return
+    TagUsageCount.objects.refresh_tags([instance.tag_id])
+
+
+models.signals.pre_save.connect(
+    remember_publication_state, sender=Post,
+    dispatch_uid='aldryn_blog.post.presave.remember_publication_state')
+models.signals.post_save.connect(
+    refresh_monthly_post_count, sender=Post,
+    dispatch_uid='aldryn_blog.post.postsave.refresh_monthly_post_count')
+models.signals.post_delete.connect(
+    refresh_monthly_post_count, sender=Post,
+    dispatch_uid='aldryn_blog.post.postdelete.refresh_monthly_post_count')
+models.signals.post_save.connect(
+    refresh_post_tag_usage_count, sender=Post,
+    dispatch_uid='aldryn_blog.post.postsave.refresh_post_tag_usage_count')
+models.signals.pre_delete.connect(
+    remember_post_tags, sender=Post,
+    dispatch_uid='aldryn_blog.post.predelete.remember_post_tags')
+models.signals.post_delete.connect(
+    refresh_deleted_post_tag_usage_count, sender=Post,
+    dispatch_uid='aldryn_blog.post.postdelete.refresh_deleted_post_tag_usage_count')
+models.signals.post_save.connect(
+    refresh_tag_usage_count, sender=TaggedUnicodeItem,
+    dispatch_uid='aldryn_blog.taggedunicodeitem.postsave.refresh_tag_usage_count')
+models.signals.post_delete.connect(
+    refresh_tag_usage_count, sender=TaggedUnicodeItem,
+    dispatch_uid='aldryn_blog.taggedunicodeitem.postdelete.refresh_tag_usage_count')
+
+
+def touch_posts(**filters):
+    """
+    Bumps updated_at of the matching posts for changes that do not save them
+    """
+    updated = Post.objects.filter(**filters).update(updated_at=timezone.now())
+    if updated:
+        bump_generation()
+    return updated
+
+
+def touch_tagged_post(sender, instance, raw=False, **kwargs):
+    if raw or instance.content_type_id != ContentType.objects.get_for_model(Post).pk:
+        return
+    touch_posts(pk=instance.object_id)
+
+
+def touch_tag_posts(sender, instance, raw=False, created=False, **kwargs):
+    if raw or created:
+        return
+    post_ids = TaggedUnicodeItem.objects.filter(
+        tag=instance.pk, content_type=ContentType.objects.get_for_model(Post)).values('object_id')
+    touch_posts(pk__in=post_ids)
+
+
+def touch_coauthored_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_posts(pk=instance.pk)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        touch_posts(pk__in=pk_set)
+    elif action == 'pre_clear':
+        touch_posts(coauthors=instance)
+
+
+def touch_category_posts(sender, instance, raw=False, created=False, **kwargs):
+    if raw or created:
+        return
+    touch_posts(category=instance.pk)
+
+
+def touch_category_translation(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    Category.objects.untranslated().filter(pk=instance.master_id).update(updated_at=timezone.now())
+    touch_posts(category=instance.master_id)
+
+
+def is_post_content_plugin(instance):
+    """
+    Returns whether instance is a plugin in the content placeholder of a post
+    """
+    if not isinstance(instance, CMSPlugin) or not instance.placeholder_id:
+        return False
+    try:
+        return instance.placeholder.slot == 'aldryn_blog_post_content'
+    except ObjectDoesNotExist:
+        # the placeholder is being deleted along with its plugins
+        return False
+
+
+def touch_post_content(sender, instance, raw=False, **kwargs):
+    if raw or not is_post_content_plugin(instance):
+        return
+    touch_posts(content=instance.placeholder_id)
+
+
+models.signals.post_save.connect(
+    touch_tagged_post, sender=TaggedUnicodeItem,
+    dispatch_uid='aldryn_blog.taggedunicodeitem.postsave.touch_tagged_post')
+models.signals.post_delete.connect(
+    touch_tagged_post, sender=TaggedUnicodeItem,
+    dispatch_uid='aldryn_blog.taggedunicodeitem.postdelete.touch_tagged_post')
+models.signals.post_save.connect(
+    touch_tag_posts, sender=UniTag,
+    dispatch_uid='aldryn_blog.unitag.postsave.touch_tag_posts')
+models.signals.post_save.connect(
+    touch_tag_posts, sender=Tag,
+    dispatch_uid='aldryn_blog.tag.postsave.touch_tag_posts')
+models.signals.m2m_changed.connect(
+    touch_coauthored_posts, sender=Post.coauthors.through,
+    dispatch_uid='aldryn_blog.post.m2mchanged.touch_coauthored_posts')
+models.signals.post_save.connect(
+    touch_category_posts, sender=Category,
+    dispatch_uid='aldryn_blog.category.postsave.touch_category_posts')
+models.signals.post_save.connect(
+    touch_category_translation, sender=Category._meta.translations_model,
+    dispatch_uid='aldryn_blog.categorytranslation.postsave.touch_category_translation')
+models.signals.post_delete.connect(
+    touch_category_translation, sender=Category._meta.translations_model,
+    dispatch_uid='aldryn_blog.categorytranslation.postdelete.touch_category_translation')
+models.signals.post_save.connect(
+    touch_post_content, dispatch_uid='aldryn_blog.cmsplugin.postsave.touch_post_content')
+models.signals.post_delete.connect(
+    touch_post_content, dispatch_uid='aldryn_blog.cmsplugin.postdelete.touch_post_content')
+models.signals.post_delete.connect(
+    record_blog_change, sender=Post,
+    dispatch_uid='aldryn_blog.post.postdelete.record_blog_change')
+for model in (UniTag, Tag, TaggedUnicodeItem, Category, Category._meta.translations_model):
+    models.signals.post_save.connect(
+        record_blog_change, sender=model,
+        dispatch_uid='aldryn_blog.%s.postsave.record_blog_change' % model.__name__.lower())
+    models.signals.post_delete.connect(
+        record_blog_change, sender=model,
+        dispatch_uid='aldryn_blog.%s.postdelete.record_blog_change' % model.__name__.lower())
+
+
+for model in (Post, UniTag, Tag, TaggedUnicodeItem, Category, Category._meta.translations_model):
+    models.signals.post_save.connect(
+        invalidate_blog_cache, sender=model,
+        dispatch_uid='aldryn_blog.%s.postsave.invalidate_blog_cache' % model.__name__.lower())
+    models.signals.post_delete.connect(
+        invalidate_blog_cache, sender=model,
+        dispatch_uid='aldryn_blog.%s.postdelete.invalidate_blog_cache' % model.__name__.lower())
+
+
+models.signals.post_save.connect(
+    invalidate_pages_cache, sender=Page,
+    dispatch_uid='aldryn_blog.page.postsave.invalidate_pages_cache')
+models.signals.post_delete.connect(
+    invalidate_pages_cache, sender=Page,
+    dispatch_uid='aldryn_blog.page.postdelete.invalidate_pages_cache')
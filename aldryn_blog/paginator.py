@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils import timezone
+
+from aldryn_common.paginator import DiggPaginator
+
+from .conf import settings
+
+
+CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def encode_cursor(post):
+    """
+    Returns the cursor pointing at the given post: its publication start (in
+    UTC) and its id.
+    """
+    publication_start = post.publication_start
+    if timezone.is_aware(publication_start):
+        publication_start = timezone.make_naive(publication_start, timezone.utc)
+    return '%s-%d' % (publication_start.strftime(CURSOR_FORMAT), post.pk)
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (publication start, id) a cursor points at
+    """
+    try:
+        publication_start, pk = cursor.split('-')
+        publication_start = datetime.datetime.strptime(publication_start, CURSOR_FORMAT)
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise InvalidPage('That cursor is not valid')
+    if settings.USE_TZ:
+        publication_start = timezone.make_aware(publication_start, timezone.utc)
+    return publication_start, pk
+
+
+class CountedDiggPaginator(DiggPaginator):
+    """
+    DiggPaginator taking the amount of objects from the ``counter`` callable
+    instead of running a COUNT over object_list.
+    """
+
+    def __init__(self, object_list, per_page, **kwargs):
+        self.counter = kwargs.pop('counter', None)
+        super(CountedDiggPaginator, self).__init__(object_list, per_page, **kwargs)
+
+    def _get_count(self):
+        if self._count is None and self.counter is not None:
+            self._count = self.counter()
+        return super(CountedDiggPaginator, self)._get_count()
+    count = property(_get_count)
+
+
+class CursorPage(object):
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<CursorPage of %d posts>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1]) if self._has_next and self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0]) if self._has_previous and self.object_list else None
+
+
+class CursorPaginator(object):
+    """
+    Pages through posts newest first by (publication_start, id), starting
+    after or before the post a cursor points at. Unlike a page number, a
+    cursor is resolved with an index range scan, so deep pages cost as much
+    as the first one and the posts are never counted.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+
+    def page(self, after=None, before=None):
+        queryset = self.queryset
+        if before:
+            publication_start, pk = decode_cursor(before)
+            queryset = queryset.filter(
+                Q(publication_start__gt=publication_start) | Q(publication_start=publication_start, pk__gt=pk))
+            posts = list(queryset.order_by('publication_start', 'pk')[:self.per_page + 1])
+            has_previous = len(posts) > self.per_page
+            return CursorPage(posts[:self.per_page][::-1], self, True, has_previous)
+
+        if after:
+            publication_start, pk = decode_cursor(after)
+            queryset = queryset.filter(
+                Q(publication_start__lt=publication_start) | Q(publication_start=publication_start, pk__lt=pk))
+        posts = list(queryset.order_by('-publication_start', '-pk')[:self.per_page + 1])
+        has_next = len(posts) > self.per_page
+        return CursorPage(posts[:self.per_page], self, has_next, bool(after))
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
-from django.db.models import Q
+from django.core.cache import cache
 from django.template import RequestContext
 
 from aldryn_search.utils import get_index_base, strip_tags
 
+from .cache import get_plugin_text_key
 from .conf import settings
 from .models import Post
 
@@ -26,8 +27,7 @@ class BlogIndex(get_index_base()):
         return obj.publication_start
 
     def get_index_queryset(self, language):
-        queryset = self.get_model().published.all()
-        return queryset.filter(Q(language=language) | Q(language__isnull=True))
+        return self.get_model().published.filter_by_language(language)
 
     def get_model(self):
         return Post
@@ -35,11 +35,20 @@ class BlogIndex(get_index_base()):
     def get_search_data(self, obj, language, request):
         lead_in = self.get_description(obj)
         text_bits = [strip_tags(lead_in)]
-        plugins = obj.content.cmsplugin_set.filter(language=language)
+        plugins = list(obj.content.cmsplugin_set.filter(language=language))
+        # the text of unchanged plugins is taken from the cache
+        keys = dict((base_plugin.pk, get_plugin_text_key(base_plugin, language)) for base_plugin in plugins)
+        cached = cache.get_many(keys.values())
+        extracted = {}
         for base_plugin in plugins:
-            instance, plugin_type = base_plugin.get_plugin_instance()
-            if instance is not None:
-                content = strip_tags(
+            content = cached.get(keys[base_plugin.pk])
+            if content is None:
+                instance, plugin_type = base_plugin.get_plugin_instance()
+                if instance is None:
+                    continue
+                content = extracted[keys[base_plugin.pk]] = strip_tags(
                     instance.render_plugin(context=RequestContext(request)))
-                text_bits.append(content)
+            text_bits.append(content)
+        if extracted:
+            cache.set_many(extracted, settings.ALDRYN_BLOG_GENERATION_TIMEOUT)
         return ' '.join(text_bits)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from haystack.signals import RealtimeSignalProcessor
+
+from .models import Post, SearchQueueEntry, is_post_content_plugin
+
+
+class QueuedSignalProcessor(RealtimeSignalProcessor):
+    """
+    Queues the changed blog posts, including edits of the plugins in their
+    content, for the update_blog_index command instead of indexing them
+    while the request is handled. Other models are indexed right away.
+    """
+
+    def get_post_ids(self, instance):
+        """
+        Returns the ids of the posts to queue for instance, or None if it
+        does not belong to the blog
+        """
+        if isinstance(instance, Post):
+            return [instance.pk]
+        if is_post_content_plugin(instance):
+            return Post.objects.filter(content=instance.placeholder_id).values_list('pk', flat=True)
+        return None
+
+    def handle_save(self, sender, instance, raw=False, **kwargs):
+        post_ids = self.get_post_ids(instance)
+        if post_ids is None:
+            return super(QueuedSignalProcessor, self).handle_save(sender, instance, raw=raw, **kwargs)
+        if not raw:
+            SearchQueueEntry.objects.enqueue(post_ids)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        post_ids = self.get_post_ids(instance)
+        if post_ids is None:
+            return super(QueuedSignalProcessor, self).handle_delete(sender, instance, **kwargs)
+        SearchQueueEntry.objects.enqueue(post_ids)
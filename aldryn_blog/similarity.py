@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Computes the related posts and related tags of the whole blog at once from
+the sparse (post x tag) incidence matrix. Requires numpy and scipy.
+"""
+import datetime
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    numpy = sparse = None
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from .conf import settings
+from .models import Post, RelatedPost, RelatedTag, TaggedUnicodeItem, get_related_score
+
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def get_top_ranked(rows, scores, limit):
+    """
+    Returns the indices of the limit best scores per row
+    """
+    order = numpy.lexsort((-scores, rows))
+    sorted_rows = rows[order]
+    rank = numpy.arange(len(order)) - numpy.searchsorted(sorted_rows, sorted_rows, side='left')
+    return order[rank < limit]
+
+
+class Similarities(object):
+
+    def __init__(self):
+        if numpy is None:
+            raise ImproperlyConfigured('Computing blog similarities requires numpy and scipy.')
+        posts = list(Post.objects.order_by('pk').values_list('pk', 'category', 'language', 'publication_start'))
+        self.post_ids = numpy.array([post[0] for post in posts], dtype=numpy.int64)
+        self.categories = numpy.array([-1 if post[1] is None else post[1] for post in posts], dtype=numpy.int64)
+        languages = dict((language, number) for number, language in enumerate(set(post[2] for post in posts)))
+        self.languages = numpy.array([languages[post[2]] for post in posts], dtype=numpy.int64)
+        self.days = numpy.array([self.get_days(post[3]) for post in posts], dtype=numpy.float64)
+
+        items = numpy.array(list(TaggedUnicodeItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(Post)).values_list('object_id', 'tag')), dtype=numpy.int64)
+        items = items.reshape(-1, 2)
+        rows = numpy.searchsorted(self.post_ids, items[:, 0])
+        # tagged items of deleted posts
+        found = self.post_ids[numpy.minimum(rows, len(self.post_ids) - 1)] if len(self.post_ids) else rows
+        existing = (rows < len(self.post_ids)) & (found == items[:, 0])
+        rows, tags = rows[existing], items[existing, 1]
+        self.tag_ids, columns = numpy.unique(tags, return_inverse=True)
+        self.tags = self.get_incidence(rows, columns, len(self.tag_ids))
+        self.tag_counts = numpy.asarray(self.tags.sum(axis=1)).ravel()
+
+    def get_days(self, value):
+        if timezone.is_aware(value):
+            value = timezone.make_naive(value, timezone.utc)
+        return (value - EPOCH).total_seconds() / 86400
+
+    def get_incidence(self, rows, columns, width):
+        matrix = sparse.csr_matrix(
+            (numpy.ones(len(rows)), (rows, columns)), shape=(len(self.post_ids), width))
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return matrix
+
+    def iter_related_posts(self, block_size=500):
+        """
+        Yields the RelatedPost objects of blocks of posts. Posts sharing tags
+        in the same language are scored like RelatedPost.objects.get_scores
+        does, by the cosine similarity of their tags, the same category and
+        the publication dates.
+        """
+        limit = settings.ALDRYN_BLOG_RELATED_POSTS_LIMIT
+        for start in range(0, len(self.post_ids), block_size):
+            stop = min(start + block_size, len(self.post_ids))
+            matrix = (self.tags[start:stop] * self.tags.T).tocoo()
+            rows, columns, shared_tags = matrix.row + start, matrix.col, matrix.data.astype(numpy.int64)
+            candidates = (rows != columns) & (self.languages[rows] == self.languages[columns])
+
+            rows, columns, shared_tags = rows[candidates], columns[candidates], shared_tags[candidates]
+            similarity = shared_tags / numpy.sqrt(self.tag_counts[rows] * self.tag_counts[columns])
+            same_category = (self.categories[rows] == self.categories[columns]) & (self.categories[rows] >= 0)
+            scores = get_related_score(same_category, similarity, numpy.abs(self.days[rows] - self.days[columns]))
+            top = get_top_ranked(rows, scores, limit)
+            yield self.post_ids[start:stop], [
+                RelatedPost(post_id=int(self.post_ids[rows[i]]), related_id=int(self.post_ids[columns[i]]),
+                            score=float(scores[i]), same_category=bool(same_category[i]),
+                            shared_tags=int(shared_tags[i]))
+                for i in top]
+
+    def get_related_tags(self):
+        """
+        Returns the RelatedTag objects, scored by the cosine similarity of
+        the (post) columns of two tags
+        """
+        matrix = (self.tags.T * self.tags).tocoo()
+        usage = numpy.asarray(self.tags.sum(axis=0)).ravel()
+        candidates = matrix.row != matrix.col
+        rows, columns, counts = matrix.row[candidates], matrix.col[candidates], matrix.data[candidates]
+        scores = counts / numpy.sqrt(usage[rows] * usage[columns])
+        return [
+            RelatedTag(tag_id=int(self.tag_ids[rows[i]]), related_id=int(self.tag_ids[columns[i]]),
+                       score=float(scores[i]), count=int(counts[i]))
+            for i in get_top_ranked(rows, scores, settings.ALDRYN_BLOG_RELATED_TAGS_LIMIT)]
+
+    def save(self):
+        for post_ids, related_posts in self.iter_related_posts():
+            RelatedPost.objects.filter(post__in=[int(post_id) for post_id in post_ids]).delete()
+            RelatedPost.objects.bulk_create(related_posts)
+        RelatedTag.objects.all().delete()
+        RelatedTag.objects.bulk_create(self.get_related_tags())
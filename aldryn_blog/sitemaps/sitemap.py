@@ -1,15 +1,50 @@
 # -*- coding: utf-8 -*-
 from django.contrib.sitemaps import Sitemap
+from django.db.models import Count, Max
 
 from ..models import Post
+from ..utils import get_date_range
+
+
+def get_years():
+    """
+    Returns the years with published posts, oldest first
+    """
+    return [date.year for date in Post.published.datetimes('publication_start', 'year')]
 
 
 class BlogSitemap(Sitemap):
     changefreq = "never"
     priority = 0.5
 
+    def __init__(self, year=None):
+        self.year = year
+
+    def get_queryset(self):
+        qs = Post.published.all()
+        if self.year:
+            start, end = get_date_range(self.year)
+            qs = qs.filter(publication_start__gte=start, publication_start__lt=end)
+        return qs
+
+    def get_state(self):
+        """
+        Returns the amount of posts in the sitemap and their latest change
+        """
+        values = self.get_queryset().order_by().aggregate(
+            count=Count('pk'), updated=Max('updated_at'), published=Max('publication_start'))
+        if not values['count']:
+            return 0, None
+        return values['count'], max(values['updated'], values['published'])
+
     def items(self):
-        return Post.published.all()
+        # only the columns needed for the URL and lastmod
+        return self.get_queryset().order_by('publication_start', 'pk').values(
+            'slug', 'language', 'publication_start', 'updated_at')
+
+    def location(self, item):
+        return Post(slug=item['slug'], language=item['language'],
+                    publication_start=item['publication_start']).get_absolute_url()
 
-    def lastmod(self, obj):
-        return obj.publication_start
+    def lastmod(self, item):
+        return max(item['publication_start'], item['updated_at'])
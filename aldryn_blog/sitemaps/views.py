@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import math
+
+from django.contrib.sites.models import get_current_site
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.core.urlresolvers import reverse
+from django.http import Http404, HttpResponse
+from django.template import loader
+from django.template.response import TemplateResponse
+from django.views.decorators.http import condition
+
+from ..cache import CACHE_PREFIX, get_or_set, make_key
+from ..conf import settings
+from .sitemap import BlogSitemap, get_years
+
+
+def index(request, template_name='aldryn_blog/sitemap_index.xml', content_type='application/xml',
+          sitemap_url_name='aldryn_blog.sitemaps.views.sitemap'):
+    """
+    Lists one sitemap section per year (split into pages of
+    BlogSitemap.limit posts), each with the latest change of its posts.
+    """
+    protocol = 'https' if request.is_secure() else 'http'
+    domain = get_current_site(request).domain
+
+    def get_sections():
+        sections = []
+        for year in get_years():
+            sitemap = BlogSitemap(year)
+            count, lastmod = sitemap.get_state()
+            location = '%s://%s%s' % (protocol, domain, reverse(sitemap_url_name, kwargs={'year': year}))
+            sections.append({'location': location, 'lastmod': lastmod})
+            for page in range(2, int(math.ceil(count / float(sitemap.limit))) + 1):
+                sections.append({'location': '%s?p=%s' % (location, page), 'lastmod': lastmod})
+        return sections
+
+    sections = get_or_set(make_key('sitemap-index', protocol, domain), get_sections)
+    return TemplateResponse(request, template_name, {'sitemaps': sections}, content_type=content_type)
+
+
+def sitemap(request, year, template_name='sitemap.xml', content_type='application/xml'):
+    """
+    Renders the posts published in the given year. The output is cached
+    for as long as the amount of posts and their latest change stay the
+    same, which for closed years is practically forever.
+    """
+    protocol = 'https' if request.is_secure() else 'http'
+    site = get_current_site(request)
+    page = request.GET.get('p', 1)
+    blog_sitemap = BlogSitemap(int(year))
+    count, lastmod = blog_sitemap.get_state()
+    if not count:
+        raise Http404('No posts in %s' % year)
+
+    state = '%s:%s:%s:%s:%s:%s' % (year, page, protocol, site.domain, count, lastmod.isoformat())
+    etag = hashlib.md5(state.encode('utf-8')).hexdigest()
+    key = '%s:sitemap:%s' % (CACHE_PREFIX, etag)
+    content = cache.get(key)
+    if content is None:
+        try:
+            urls = blog_sitemap.get_urls(page=page, site=site, protocol=protocol)
+        except EmptyPage:
+            raise Http404('Page %s empty' % page)
+        except PageNotAnInteger:
+            raise Http404("No page '%s'" % page)
+        content = loader.render_to_string(template_name, {'urlset': urls})
+        cache.set(key, content, settings.ALDRYN_BLOG_GENERATION_TIMEOUT)
+
+    @condition(etag_func=lambda request: etag, last_modified_func=lambda request: lastmod)
+    def section(request):
+        return HttpResponse(content, content_type=content_type)
+    return section(request)
@@ -1,7 +1,16 @@
 # -*- coding: utf-8 -*-
 from django import template
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
 
+from cms.utils.placeholder import restore_sekizai_context
+from sekizai.helpers import Watcher
+
+from ..cache import get_post_content_key, get_post_item_key
+from ..conf import settings
 from ..models import Post
 
 
@@ -22,6 +31,64 @@ def user_name(user):
     return user.username
 
 
+@register.simple_tag(takes_context=True)
+def render_blog_items(context, posts, image=False):
+    """
+    Renders aldryn_blog/includes/blog_item.html for each post, caching the
+    output per post revision, language, image flag and edit mode.
+    """
+    posts = list(posts)
+    toolbar = getattr(context.get('request'), 'toolbar', None)
+    edit_mode = getattr(toolbar, 'edit_mode', False)
+    language = get_language()
+    keys = dict((post.pk, get_post_item_key(post, language, image, edit_mode)) for post in posts)
+    cached = cache.get_many(keys.values())
+
+    template = None
+    rendered = {}
+    items = []
+    for post in posts:
+        item = cached.get(keys[post.pk])
+        if item is None:
+            template = template or get_template('aldryn_blog/includes/blog_item.html')
+            context.update({'post': post, 'image': image})
+            try:
+                item = rendered[keys[post.pk]] = template.render(context)
+            finally:
+                context.pop()
+        items.append(item)
+    if rendered:
+        cache.set_many(rendered, settings.ALDRYN_BLOG_CACHE_TIMEOUT)
+    return mark_safe(''.join(items))
+
+
+@register.simple_tag(takes_context=True)
+def render_post_content(context, post, language=None):
+    """
+    Renders the content placeholder of post like {% render_placeholder %},
+    caching the output and the sekizai blocks it adds per post revision and
+    language. Staff users and edit mode always get a fresh rendering.
+    """
+    request = context.get('request')
+    placeholder = post.content
+    if not request or not placeholder:
+        return ''
+    toolbar = getattr(request, 'toolbar', None)
+    timeout = settings.ALDRYN_BLOG_CONTENT_CACHE_TIMEOUT
+    if not timeout or getattr(toolbar, 'edit_mode', False) or request.user.is_staff:
+        return placeholder.render(context, None, lang=language)
+
+    key = get_post_content_key(post, language or get_language())
+    cached = cache.get(key)
+    if cached is not None:
+        restore_sekizai_context(context, cached['sekizai'])
+        return mark_safe(cached['content'])
+    watcher = Watcher(context)
+    content = placeholder.render(context, None, lang=language, use_cache=False)
+    cache.set(key, {'content': content, 'sekizai': watcher.get_changes()}, timeout)
+    return content
+
+
 @register.assignment_tag
 def get_blog_post_tags(post):
     """
@@ -37,7 +104,7 @@ def get_blog_post_tags(post):
 @register.assignment_tag
 def get_related_posts(post, by_categories=True, by_tags=True, by_latest=True, wanted_count=5):
     """
-    Returns a list of blog objects being related to the one given.
+    Returns a list of published blog objects being related to the one given.
 
     "Related" can mean one or multiple of the following conditions
     (being configurable by the arguments passed to this function):
@@ -45,55 +112,20 @@ def get_related_posts(post, by_categories=True, by_tags=True, by_latest=True, wa
      - Having one or more tags in common
      - Just being released recently
 
-    Another rule to follow:
-     - found_objects == wanted_count => return found_objects
-     - found_objects < wanted_count => fill the missing count with the next condition
-     - found_objects > wanted_count => further trim down found_objects by the next condition
+    The posts sharing the category or tags are precomputed in the RelatedPost
+    table and ranked by their score. Missing posts are filled up with the
+    latest ones.
     """
-
-    given_category = post.category_id
-    given_tags = post.tags.values_list('pk', flat=True)
-    given_language = post.language
-
-    found = None
-    all_posts = Post.objects.filter(language=given_language).order_by('publication_start')
-
-    if by_categories:
-        posts_by_category = all_posts.filter(category_id=given_category)
-
-        if posts_by_category.count() == wanted_count:
-            return list(posts_by_category)
-
-        found = posts_by_category
-
-    if by_tags:
-        append = False
-        if found:
-            if found.count() > wanted_count:
-                qs = found
-            else:
-                append = True
-                qs = all_posts
-            found = list(found)
-        else:
-            qs = all_posts
-
-        posts_by_tags = list(qs.filter(tags__in=given_tags).exclude(id__in=[p.id for p in found]))
-
-        if posts_by_tags:
-            if append:
-                found += posts_by_tags
-            else:
-                found = posts_by_tags
-
-            if len(found) >= wanted_count:
-                return posts_by_tags[:wanted_count]
-
-    if by_latest:
-        if not found:
-            found = []
-
-        amount = wanted_count - len(found) if len(found) <= wanted_count else 0
-        return found[:wanted_count - amount] + list(all_posts.exclude(id__in=[p.id for p in found])[:amount])
-
-    return found[:wanted_count]
+    found = []
+    if by_categories or by_tags:
+        related = {'related_by__post': post}
+        if not by_tags:
+            related['related_by__same_category'] = True
+        elif not by_categories:
+            related['related_by__shared_tags__gt'] = 0
+        found = list(Post.published.filter(**related).order_by('-related_by__score')[:wanted_count])
+
+    if by_latest and len(found) < wanted_count:
+        latest = Post.published.filter(language=post.language).exclude(pk__in=[post.pk] + [p.pk for p in found])
+        found += list(latest.order_by('-publication_start')[:wanted_count - len(found)])
+    return found
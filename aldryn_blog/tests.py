@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import datetime
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from .models import Post, sync_live_posts
+from .utils import get_now
+
+
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+@contextmanager
+def frozen_now(moment):
+    now = timezone.now
+    timezone.now = lambda: moment
+    try:
+        yield
+    finally:
+        timezone.now = now
+
+
+class LivePostsTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        # aligned to the minute, so the time buckets below start at it
+        self.now = timezone.now().replace(second=0, microsecond=0) + datetime.timedelta(days=1)
+
+    def create_post(self, start, end=None):
+        return Post.objects.create(
+            title='Post %d' % Post.objects.count(), lead_in='Lead in', author=self.author,
+            publication_start=start, publication_end=end)
+
+    def assertLive(self, post, live):
+        self.assertEqual(Post.objects.get(pk=post.pk).is_live, live)
+        self.assertEqual(Post.published.filter(pk=post.pk).exists(), live)
+
+    def test_is_live_at_publication_start(self):
+        post = Post(publication_start=self.now)
+        self.assertFalse(post.get_is_live(self.now - MICROSECOND))
+        self.assertTrue(post.get_is_live(self.now))
+        self.assertTrue(post.get_is_live(self.now + MICROSECOND))
+
+    def test_is_live_until_publication_end(self):
+        post = Post(publication_start=self.now - datetime.timedelta(days=1), publication_end=self.now)
+        self.assertTrue(post.get_is_live(self.now - MICROSECOND))
+        self.assertTrue(post.get_is_live(self.now))
+        self.assertFalse(post.get_is_live(self.now + MICROSECOND))
+
+    def test_save_sets_is_live(self):
+        with frozen_now(self.now):
+            live = self.create_post(self.now)
+            scheduled = self.create_post(self.now + MICROSECOND)
+            expired = self.create_post(self.now - datetime.timedelta(days=1), self.now - MICROSECOND)
+        self.assertLive(live, True)
+        self.assertLive(scheduled, False)
+        self.assertLive(expired, False)
+
+    def test_sync_flips_at_publication_start(self):
+        with frozen_now(self.now - datetime.timedelta(days=1)):
+            post = self.create_post(self.now)
+        self.assertEqual(sync_live_posts(self.now - MICROSECOND), 0)
+        self.assertLive(post, False)
+        self.assertEqual(sync_live_posts(self.now), 1)
+        self.assertLive(post, True)
+
+    def test_sync_flips_after_publication_end(self):
+        with frozen_now(self.now - datetime.timedelta(days=1)):
+            post = self.create_post(self.now - datetime.timedelta(days=1), self.now)
+        self.assertEqual(sync_live_posts(self.now), 0)
+        self.assertLive(post, True)
+        self.assertEqual(sync_live_posts(self.now + MICROSECOND), 1)
+        self.assertLive(post, False)
+
+    def test_published_does_not_flip(self):
+        with frozen_now(self.now - datetime.timedelta(days=1)):
+            post = self.create_post(self.now)
+        with frozen_now(self.now + datetime.timedelta(days=1)):
+            self.assertFalse(Post.published.filter(pk=post.pk).exists())
+            sync_live_posts()
+            self.assertTrue(Post.published.filter(pk=post.pk).exists())
+
+    @override_settings(ALDRYN_BLOG_NOW_GRANULARITY=60)
+    def test_now_granularity(self):
+        with frozen_now(self.now + datetime.timedelta(seconds=59, microseconds=999999)):
+            self.assertEqual(get_now(), self.now)
+        with frozen_now(self.now + datetime.timedelta(seconds=60)):
+            self.assertEqual(get_now(), self.now + datetime.timedelta(seconds=60))
+
+    @override_settings(ALDRYN_BLOG_NOW_GRANULARITY=60)
+    def test_posts_change_with_the_time_bucket(self):
+        with frozen_now(self.now - datetime.timedelta(days=1)):
+            half_minute = self.now + datetime.timedelta(seconds=30)
+            scheduled = self.create_post(half_minute)
+            expiring = self.create_post(self.now - datetime.timedelta(days=1), half_minute)
+
+        # the whole bucket uses its start as the current time
+        with frozen_now(self.now + datetime.timedelta(seconds=59, microseconds=999999)):
+            self.assertEqual(sync_live_posts(), 0)
+        self.assertLive(scheduled, False)
+        self.assertLive(expiring, True)
+
+        with frozen_now(self.now + datetime.timedelta(seconds=60)):
+            self.assertEqual(sync_live_posts(), 2)
+        self.assertLive(scheduled, True)
+        self.assertLive(expiring, False)
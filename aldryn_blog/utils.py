@@ -1,12 +1,15 @@
+import datetime
+
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q
-from django.template.defaultfilters import slugify
 from django.utils import timezone
 from django.utils.translation import get_language
 
 from hvad.utils import get_translation
 
+from .conf import settings
+
 
 def get_blog_languages():
     from .models import Post
@@ -14,22 +17,82 @@ def get_blog_languages():
         language__isnull=True).order_by('language').values_list('language', flat=True).distinct()
 
 
-def get_blog_authors(coauthors=True):
-    now = timezone.now()
+def get_languages():
+    return [language for language, name in settings.LANGUAGES]
+
+
+def get_date_range(year, month=None, day=None, tz=None):
+    """
+    Returns the half-open (start, end) datetime range covering the given
+    year, month or day. Range bounds are aware in tz (defaults to the current
+    time zone) when USE_TZ is enabled.
+    """
+    start = datetime.datetime(int(year), int(month or 1), int(day or 1))
+    if day:
+        end = start + datetime.timedelta(days=1)
+    elif month:
+        end = datetime.datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    else:
+        end = datetime.datetime(start.year + 1, 1, 1)
+    if settings.USE_TZ:
+        tz = tz or timezone.get_current_timezone()
+        start, end = timezone.make_aware(start, tz), timezone.make_aware(end, tz)
+    return start, end
+
+
+def get_month_bucket(value):
+    """
+    Returns the (year, month) a datetime falls in, in the default time zone
+    """
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = timezone.localtime(value, timezone.get_default_timezone())
+    return value.year, value.month
 
-    filters = (
-        (Q(post__publication_end__isnull=True)
-         | Q(post__publication_end__gte=now))
-        & (Q(post__language=get_language()) | Q(post__language__isnull=True))
-        & Q(post__publication_start__lte=now)
-    )
+
+def get_now():
+    """
+    Returns the current time rounded down to ALDRYN_BLOG_NOW_GRANULARITY
+    seconds, so posts enter or leave the publication window at time bucket
+    edges only.
+    """
+    return _get_bucket_floor(timezone.now())
+
+
+def _get_bucket_floor(moment):
+    granularity = settings.ALDRYN_BLOG_NOW_GRANULARITY
+    if not granularity:
+        return moment
+    seconds = moment.hour * 3600 + moment.minute * 60 + moment.second
+    return moment.replace(microsecond=0) - datetime.timedelta(seconds=seconds % granularity)
+
+
+def get_bucket_start(moment):
+    """
+    Returns the first time bucket edge at or after moment
+    """
+    floor = _get_bucket_floor(moment)
+    if floor == moment:
+        return moment
+    return floor + datetime.timedelta(seconds=settings.ALDRYN_BLOG_NOW_GRANULARITY)
+
+
+def get_bucket_end(moment):
+    """
+    Returns the first time bucket edge after moment
+    """
+    granularity = settings.ALDRYN_BLOG_NOW_GRANULARITY
+    if not granularity:
+        return moment
+    return _get_bucket_floor(moment) + datetime.timedelta(seconds=granularity)
+
+
+def get_blog_authors(coauthors=True):
+    filters = Q(post__is_live=True) & Q(post__visibility__language=get_language())
 
     if coauthors:
         coauthors_filters = (
-            (Q(aldryn_blog_coauthors__publication_end__isnull=True)
-             | Q(aldryn_blog_coauthors__publication_end__gte=now))
-            & (Q(aldryn_blog_coauthors__language=get_language()) | Q(aldryn_blog_coauthors__language__isnull=True))
-            & Q(aldryn_blog_coauthors__publication_start__lte=now)
+            Q(aldryn_blog_coauthors__is_live=True)
+            & Q(aldryn_blog_coauthors__visibility__language=get_language())
         )
 
         filters = (filters | coauthors_filters)
@@ -39,51 +102,31 @@ def get_blog_authors(coauthors=True):
 
 def generate_slugs(users):
     """
-    Takes a queryset of users and creates nice slugs
-    Returns the same queryset but with a slug attribute on each user
+    Takes a queryset of users and attaches their registered slugs
+    Returns the users as a list with a slug attribute on each user
     """
+    from .models import AuthorSlug
 
-    slugs = []
-    slugged_users = []
-
+    users = list(users)
+    slugs = AuthorSlug.objects.get_slugs(users)
     for user in users:
-        slug = ''
-        _slug = slugify(user.get_full_name())
-        if not _slug:
-            slug = user.get_username()
-
-        elif _slug not in slugs:
-            slug = _slug
-
-        else:
-            for i in xrange(2, 100):
-                if not '%s-%i' % (_slug, i) in slugs:
-                    slug = '%s-%i' % (_slug, i)
-                    break
-
-        if not slug:
-            slug = user.get_username()
-
-        slugs.append(slug)
-        user.slug = slug
-        slugged_users.append(user)
-
-    return slugged_users
+        user.slug = slugs[user.pk]
+    return users
 
 
 def get_user_from_slug(find_slug):
-    authors = generate_slugs(get_blog_authors())
-    for author in authors:
-        if author.slug == find_slug:
-            return author
-    return None
+    from .models import AuthorSlug
+
+    try:
+        return AuthorSlug.objects.select_related('user').get(slug=find_slug).user
+    except AuthorSlug.DoesNotExist:
+        return None
 
 
 def get_slug_for_user(find_user):
-    authors = generate_slugs(get_blog_authors())
-    for author in authors:
-        if author == find_user:
-            return author.slug
+    from .models import AuthorSlug
+
+    return AuthorSlug.objects.get_slug_for_user(find_user)
 
 
 def get_slug_in_language(record, language):
@@ -1,28 +1,92 @@
 # -*- coding: utf-8 -*-
 import datetime
+import hashlib
 
 from django.conf import settings
 from django.core.urlresolvers import reverse, resolve
+from django.core.paginator import InvalidPage
+from django.db.models import Max
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.utils.translation import override, get_language_from_request
+from django.utils import timezone
+from django.utils.translation import override, get_language, get_language_from_request
 from django.views import generic
+from django.views.decorators.http import condition
 from django.views.generic.dates import ArchiveIndexView
 from django.views.generic.detail import DetailView
 from django.views.generic.list import ListView
-from django.contrib.auth.models import User
 
+from cms.models import Page
 from menus.utils import set_language_changer
 
-from aldryn_common.paginator import DiggPaginator, paginate_by
+from aldryn_common.paginator import paginate_by
 from aldryn_blog import request_post_identifier
 
-from .models import Post, UniTag, Category
-from .utils import generate_slugs, get_user_from_slug, get_blog_authors, get_slug_for_user
+from .cache import get_generation, get_last_change, get_or_set, make_key
+from .models import MonthlyPostCount, Post, RelatedTag, UniTag, Category
+from .paginator import CountedDiggPaginator, CursorPaginator
+from .utils import generate_slugs, get_date_range, get_now, get_user_from_slug, get_blog_authors
 
 
 # PAGINATE_BY = getattr(settings, 'ALDRYN_BLOG_PAGINATE_BY', 10)
 
-class BasePostView(object):
+def get_pages_last_modified():
+    return Page.objects.aggregate(value=Max('changed_date'))['value'] or False
+
+
+class ConditionalMixin(object):
+    """
+    Answers GET requests with 304 Not Modified while the client's copy is
+    still current. Logged in users (staff may see unpublished posts and the
+    toolbar) always get the full response.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        view = super(ConditionalMixin, self).dispatch
+        if request.method in ('GET', 'HEAD') and not request.user.is_authenticated():
+            last_modified = self.get_last_modified()
+            etag = self.get_etag(last_modified)
+            view = condition(etag_func=lambda request, *args, **kwargs: etag,
+                             last_modified_func=lambda request, *args, **kwargs: last_modified)(view)
+        return view(request, *args, **kwargs)
+
+    def get_modified_queryset(self):
+        """
+        Returns the posts (in any publication state) the response depends on
+        """
+        if getattr(settings, 'ALDRYN_BLOG_SHOW_ALL_LANGUAGES', False):
+            return Post.objects.all()
+        return Post.objects.filter_by_current_language()
+
+    def get_posts_last_modified(self):
+        """
+        Returns the latest edit, publication or expiry of the posts the
+        response depends on, or False if there are none.
+        """
+        posts = self.get_modified_queryset().order_by()
+        now = get_now()
+        dates = [
+            posts.aggregate(value=Max('updated_at'))['value'],
+            posts.filter(publication_start__lte=now).aggregate(value=Max('publication_start'))['value'],
+            posts.filter(publication_end__lte=now).aggregate(value=Max('publication_end'))['value'],
+        ]
+        return max(date for date in dates if date) if any(dates) else False
+
+    def get_last_modified(self):
+        path = hashlib.md5(self.request.path.encode('utf-8')).hexdigest()
+        key = make_key('last-modified', path, get_language())
+        # any blog change counts, the pages also show menus, related posts and plugins
+        dates = [get_or_set(key, self.get_posts_last_modified), get_last_change()]
+        # the pages around the blog (menus, static content) are edited in the CMS
+        dates.append(get_or_set(make_key('last-modified', namespace='pages'), get_pages_last_modified))
+        return max(date for date in dates if date)
+
+    def get_etag(self, last_modified):
+        bits = '%s:%s:%s' % (get_language(), last_modified.isoformat(), get_generation())
+        return hashlib.md5(bits.encode('utf-8')).hexdigest()
+
+
+class BasePostView(ConditionalMixin):
 
     def get_queryset(self):
         if self.request.user.is_staff:
@@ -31,32 +95,86 @@ class BasePostView(object):
             manager = Post.published
 
         if getattr(settings, 'ALDRYN_BLOG_SHOW_ALL_LANGUAGES', False):
-            return manager
+            return self.filter_posts(manager.all())
+
+        return self.filter_posts(manager.filter_by_current_language())
+
+    def filter_posts(self, queryset):
+        """
+        Narrows the posts down to the ones shown by the view
+        """
+        return queryset
 
-        return manager.filter_by_current_language()
+    def get_modified_queryset(self):
+        return self.filter_posts(super(BasePostView, self).get_modified_queryset())
 
     def render_to_response(self, context, **response_kwargs):
         response_kwargs['current_app'] = resolve(self.request.path).namespace
         return super(BasePostView, self).render_to_response(context, **response_kwargs)
 
 
-class ArchiveView(BasePostView, ArchiveIndexView):
+class CursorPaginationMixin(object):
+    """
+    Pages through the posts with the ``after`` and ``before`` cursors of
+    CursorPaginator instead of page numbers when
+    ALDRYN_BLOG_CURSOR_PAGINATION is enabled.
+    """
+
+    def get_context_data(self, **kwargs):
+        if settings.ALDRYN_BLOG_CURSOR_PAGINATION:
+            paginator = CursorPaginator(kwargs.get('object_list', self.object_list), paginate_by())
+            try:
+                page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+            except InvalidPage as e:
+                raise Http404(str(e))
+            kwargs['page'] = page
+            kwargs['object_list'] = page.object_list
+            kwargs['cursor_pagination'] = True
+        return super(CursorPaginationMixin, self).get_context_data(**kwargs)
+
+
+class ArchiveView(CursorPaginationMixin, BasePostView, ArchiveIndexView):
 
     date_field = 'publication_start'
     allow_empty = True
     allow_future = True
     # paginate_by = PAGINATE_BY
 
-    def get_queryset(self):
-        qs = BasePostView.get_queryset(self)
-        if 'day' in self.kwargs:
-            qs = qs.filter(publication_start__day=self.kwargs['day'])
-        if 'month' in self.kwargs:
-            qs = qs.filter(publication_start__month=self.kwargs['month'])
+    def filter_posts(self, qs):
+        # a range on the column itself can use its index, unlike __year & co;
+        # in the default time zone, like the monthly post counts
         if 'year' in self.kwargs:
-            qs = qs.filter(publication_start__year=self.kwargs['year'])
+            try:
+                start, end = get_date_range(self.kwargs['year'], self.kwargs.get('month'), self.kwargs.get('day'),
+                                            tz=timezone.get_default_timezone())
+            except ValueError:
+                raise Http404('Invalid date')
+            qs = qs.filter(publication_start__gte=start, publication_start__lt=end)
         return qs
 
+    def count_posts(self, queryset, page=None):
+        """
+        Returns the amount of posts in the archive (or the year or month of
+        it). The published posts of a language are read from the monthly
+        post counts, which lag behind publications until
+        process_blog_publications ran. Days, results of up to
+        ALDRYN_BLOG_EXACT_COUNT_LIMIT posts and pages reaching the end of the
+        results are counted exactly.
+        """
+        if self.request.user.is_staff:
+            return queryset.count()
+        bits = (get_language(), self.kwargs.get('year'), self.kwargs.get('month'), self.kwargs.get('day'))
+        if 'day' not in self.kwargs and not getattr(settings, 'ALDRYN_BLOG_SHOW_ALL_LANGUAGES', False):
+            total = get_or_set(make_key('post-count-estimate', *bits), lambda: MonthlyPostCount.objects.get_count(
+                get_language(), year=self.kwargs.get('year'), month=self.kwargs.get('month')))
+            try:
+                page = int(page)
+            except (TypeError, ValueError):
+                page = None
+            if total > settings.ALDRYN_BLOG_EXACT_COUNT_LIMIT and page and page * paginate_by() < total:
+                return total
+        return get_or_set(make_key('post-count', *bits), queryset.count)
+
     def get_context_data(self, **kwargs):
         page = self.request.GET.get('page', 1)
         kwargs['day'] = int(
@@ -68,13 +186,15 @@ class ArchiveView(BasePostView, ArchiveIndexView):
         if kwargs['year']:
             kwargs['archive_date'] = datetime.date(
                 kwargs['year'], kwargs['month'] or 1, kwargs['day'] or 1)
-        kwargs['page'] = DiggPaginator(
-            kwargs['object_list'], paginate_by(), body=6, padding=2).page(page)
-        kwargs['object_list'] = kwargs['page'].object_list
+        if not settings.ALDRYN_BLOG_CURSOR_PAGINATION:
+            kwargs['page'] = CountedDiggPaginator(
+                kwargs['object_list'], paginate_by(), body=6, padding=2,
+                counter=lambda: self.count_posts(kwargs['object_list'], page)).page(page)
+            kwargs['object_list'] = kwargs['page'].object_list
         return super(ArchiveView, self).get_context_data(**kwargs)
 
 
-class AuthorsListView(generic.ListView):
+class AuthorsListView(ConditionalMixin, generic.ListView):
     template_name = 'aldryn_blog/author_list.html'
 
     def get_queryset(self):
@@ -86,39 +206,37 @@ class AuthorsListView(generic.ListView):
         return super(AuthorsListView, self).render_to_response(context, **response_kwargs)
 
 
-class AuthorEntriesView(BasePostView, ListView):
+class AuthorEntriesView(CursorPaginationMixin, BasePostView, ListView):
 
-    def get_queryset(self):
-        qs = BasePostView.get_queryset(self)
+    def get_author(self):
+        if not hasattr(self, '_author'):
+            self._author = get_user_from_slug(self.kwargs['slug']) if 'slug' in self.kwargs else None
+        return self._author
+
+    def filter_posts(self, qs):
         if 'slug' in self.kwargs:
-            qs = qs.filter(
-                author__username=get_user_from_slug(self.kwargs['slug']))
+            qs = qs.filter(author=self.get_author())
         return qs
 
     def get_context_data(self, **kwargs):
         if 'slug' in self.kwargs:
-            try:
-                user = get_slug_for_user(
-                    User.objects.get(username=self.kwargs.get('slug')))
-            except User.DoesNotExist:
-                user = None
-            kwargs['author'] = user
+            kwargs['author'] = self.get_author()
         return super(AuthorEntriesView, self).get_context_data(**kwargs)
 
 
-class CategoryListView(generic.ListView):
+class CategoryListView(ConditionalMixin, generic.ListView):
     template_name = 'aldryn_blog/category_list.html'
 
     def get_queryset(self):
         language = get_language_from_request(self.request, check_path=True)
-        return Post.published.get_categories(language)
+        return Category.objects.get_with_usage_count(language, include_empty=False)
 
     def render_to_response(self, context, **response_kwargs):
         response_kwargs['current_app'] = resolve(self.request.path).namespace
         return super(CategoryListView, self).render_to_response(context, **response_kwargs)
 
 
-class CategoryPostListView(BasePostView, ListView):
+class CategoryPostListView(CursorPaginationMixin, BasePostView, ListView):
 
     def get(self, *args, **kwargs):
         self.object = self.get_object()
@@ -127,33 +245,33 @@ class CategoryPostListView(BasePostView, ListView):
         return response
 
     def get_object(self):
-        return get_object_or_404(Category.objects.language(), slug=self.kwargs['category'])
+        if not hasattr(self, '_category'):
+            self._category = get_object_or_404(Category.objects.language(), slug=self.kwargs['category'])
+        return self._category
 
-    def get_queryset(self):
-        qs = super(CategoryPostListView, self).get_queryset()
-        return qs.filter(category=self.object)
+    def filter_posts(self, qs):
+        return qs.filter(category=self.get_object())
 
     def get_context_data(self, **kwargs):
         kwargs['category'] = self.get_object()
         return super(CategoryPostListView, self).get_context_data(**kwargs)
 
 
-class TagsListView(generic.ListView):
+class TagsListView(ConditionalMixin, generic.ListView):
     template_name = 'aldryn_blog/tag_list.html'
 
     def get_queryset(self):
         language = get_language_from_request(self.request, check_path=True)
-        return Post.published.get_tags(language)
+        return Post.published.get_tags(language=language)
 
     def render_to_response(self, context, **response_kwargs):
         response_kwargs['current_app'] = resolve(self.request.path).namespace
         return super(TagsListView, self).render_to_response(context, **response_kwargs)
 
 
-class TaggedListView(BasePostView, ListView):
+class TaggedListView(CursorPaginationMixin, BasePostView, ListView):
 
-    def get_queryset(self):
-        qs = super(TaggedListView, self).get_queryset()
+    def filter_posts(self, qs):
         return qs.filter(tags__slug=self.kwargs['tag'])
 
     def get_context_data(self, **kwargs):
@@ -163,6 +281,8 @@ class TaggedListView(BasePostView, ListView):
             kwargs['tag'] = UniTag.objects.get(slug=self.kwargs.get('tag'))
         except UniTag.DoesNotExist:
             kwargs['tag'] = None
+        kwargs['related_tags'] = RelatedTag.objects.filter(tag=kwargs['tag']).select_related('related') \
+            if kwargs['tag'] else []
         return super(TaggedListView, self).get_context_data(**kwargs)
 
 
@@ -185,6 +305,9 @@ class PostDetailView(BasePostView, DetailView):
                 set_language_changer(request, post_language_changer)
         return response
 
+    def get_modified_queryset(self):
+        return super(PostDetailView, self).get_modified_queryset().filter(slug=self.kwargs['slug'])
+
     def get_context_data(self, **kwargs):
         kwargs[
             'placeholder_language'] = settings.ALDRYN_BLOG_PLUGIN_LANGUAGE or settings.LANGUAGES[0][0]
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the archive filters on a synthetic post table in SQLite: the
+date extraction Django generates for ``publication_start__year`` & co and
+the half-open ranges ArchiveView filters with.
+
+    python benchmarks/archive_date_range.py [amount of posts]
+
+Only needs the standard library.
+"""
+from __future__ import print_function
+
+import datetime
+import random
+import sqlite3
+import sys
+import time
+
+
+START = datetime.datetime(2000, 1, 1)
+
+
+def django_datetime_extract(lookup_type, value, tzname):
+    # what Django registers on SQLite connections for the __year lookups
+    return int(value[{'year': slice(0, 4), 'month': slice(5, 7), 'day': slice(8, 10)}[lookup_type]])
+
+
+def create_table(connection, amount):
+    connection.execute('CREATE TABLE aldryn_blog_post (id INTEGER PRIMARY KEY, slug TEXT, publication_start TEXT)')
+    random.seed(0)
+    seconds = 15 * 365 * 24 * 60 * 60
+    rows = ((number, 'post-%d' % number, str(START + datetime.timedelta(seconds=random.randrange(seconds))))
+            for number in range(amount))
+    connection.executemany('INSERT INTO aldryn_blog_post VALUES (?, ?, ?)', rows)
+    connection.execute('CREATE INDEX aldryn_blog_post_publication_start ON aldryn_blog_post (publication_start)')
+    connection.execute('ANALYZE')
+
+
+def run(connection, sql, params, repeat=5):
+    plan = ' / '.join(row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + sql, params))
+    started = time.time()
+    for _ in range(repeat):
+        count = connection.execute(sql, params).fetchone()[0]
+    return count, (time.time() - started) / repeat * 1000, plan
+
+
+def main(amount):
+    connection = sqlite3.connect(':memory:')
+    connection.create_function('django_datetime_extract', 3, django_datetime_extract)
+    create_table(connection, amount)
+    print('%d posts' % amount)
+
+    queries = [
+        ('year', 'django_datetime_extract(\'year\', publication_start, NULL) = ?', (2010,),
+         (str(datetime.datetime(2010, 1, 1)), str(datetime.datetime(2011, 1, 1)))),
+        ('month', 'django_datetime_extract(\'year\', publication_start, NULL) = ? '
+                  'AND django_datetime_extract(\'month\', publication_start, NULL) = ?', (2010, 6),
+         (str(datetime.datetime(2010, 6, 1)), str(datetime.datetime(2010, 7, 1)))),
+        ('day', 'django_datetime_extract(\'year\', publication_start, NULL) = ? '
+                'AND django_datetime_extract(\'month\', publication_start, NULL) = ? '
+                'AND django_datetime_extract(\'day\', publication_start, NULL) = ?', (2010, 6, 15),
+         (str(datetime.datetime(2010, 6, 15)), str(datetime.datetime(2010, 6, 16)))),
+    ]
+    for name, extract, extract_params, range_params in queries:
+        for label, sql, params in [
+                ('extract', 'SELECT COUNT(*) FROM aldryn_blog_post WHERE ' + extract, extract_params),
+                ('range', 'SELECT COUNT(*) FROM aldryn_blog_post '
+                          'WHERE publication_start >= ? AND publication_start < ?', range_params)]:
+            count, duration, plan = run(connection, sql, params)
+            print('%-5s %-7s %7d posts %9.2f ms  %s' % (name, label, count, duration, plan))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -41,6 +41,9 @@ setup(
     license='LICENSE',
     platforms=['OS Independent'],
     install_requires=REQUIREMENTS,
+    extras_require={
+        'similarity': ['numpy', 'scipy'],
+    },
     classifiers=CLASSIFIERS,
     include_package_data=True,
     zip_safe=False